@@ -0,0 +1,247 @@
+import os
+import re
+import sys
+import json
+import mmap
+import hashlib
+import time
+import struct
+import threading
+
+
+# Immutable binary catalog snapshot, shared across worker processes via mmap.
+#
+# Layout (little endian):
+#
+#   header     magic "CAIC", version, track/playlist counts, section offsets
+#              and a hash of the playlists the snapshot was built from
+#   tracks     fixed 20-byte records sorted by video ID:
+#              video ID (11 bytes), title offset (u32), title length (u16)
+#   playlists  16-byte records: name offset, name length, track count, first entry
+#   entries    u32 track record numbers, in playlist order
+#   strings    UTF-8 titles and playlist names
+#
+# Every process maps the same file read-only, so the catalog lives once in the
+# page cache no matter how many workers are running, and opening it costs the
+# same at 50 or 50,000 videos. A new snapshot is written next to the old one
+# and swapped in with os.replace(); readers notice and remap on next access.
+# ensure_snapshot() rebuilds a snapshot whenever its source playlists change.
+
+MAGIC = b"CAIC"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHIIIIII16s")
+TRACK = struct.Struct("<11sxIH2x")
+PLAYLIST = struct.Struct("<IHxxII")
+ENTRY = struct.Struct("<I")
+
+VIDEO_ID_LENGTH = 11
+MAX_STRING_BYTES = 0xFFFF
+
+VIDEO_ID_PATTERN = re.compile(r"(?:v=|youtu\.be\/|embed\/)([a-zA-Z0-9_-]{11})")
+
+
+def track_video_id(track):
+    match = VIDEO_ID_PATTERN.search(track["url"])
+    return match.group(1) if match else track["url"]
+
+
+def _encode_string(text):
+    return text.encode("utf-8")[:MAX_STRING_BYTES].decode("utf-8", "ignore").encode("utf-8")
+
+
+def source_digest(playlists):
+    """Hash of a {playlist name: [{"url", "title"}]} catalog, stored in its snapshot"""
+    data = json.dumps(playlists, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def build_snapshot(playlists, path):
+    """Write a {playlist name: [{"url", "title"}]} catalog to `path` atomically"""
+    titles = {}
+    for tracks in playlists.values():
+        for track in tracks:
+            titles.setdefault(track_video_id(track), track["title"])
+    video_ids = sorted(video_id for video_id in titles if len(video_id) == VIDEO_ID_LENGTH)
+    record_numbers = {video_id: i for i, video_id in enumerate(video_ids)}
+
+    strings = bytearray()
+
+    def add_string(text):
+        data = _encode_string(text)
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    track_records = bytearray()
+    for video_id in video_ids:
+        offset, length = add_string(titles[video_id])
+        track_records += TRACK.pack(video_id.encode("ascii"), offset, length)
+
+    playlist_records = bytearray()
+    entries = bytearray()
+    entry_count = 0
+    for name, tracks in playlists.items():
+        numbers = [record_numbers[video_id] for video_id in map(track_video_id, tracks) if video_id in record_numbers]
+        offset, length = add_string(name)
+        playlist_records += PLAYLIST.pack(offset, length, len(numbers), entry_count)
+        for number in numbers:
+            entries += ENTRY.pack(number)
+        entry_count += len(numbers)
+
+    tracks_offset = HEADER.size
+    playlists_offset = tracks_offset + len(track_records)
+    entries_offset = playlists_offset + len(playlist_records)
+    strings_offset = entries_offset + len(entries)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(video_ids), len(playlists),
+                         tracks_offset, playlists_offset, entries_offset, strings_offset,
+                         source_digest(playlists))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for section in (header, track_records, playlist_records, entries, strings):
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def ensure_snapshot(playlists, path):
+    """Build `path` unless it is a current snapshot of `playlists`, returns True if built"""
+    try:
+        with open(path, "rb") as f:
+            magic, version, *_, digest = HEADER.unpack(f.read(HEADER.size))
+        if magic == MAGIC and version == VERSION and digest == source_digest(playlists):
+            return False
+    except (OSError, struct.error):
+        pass
+    build_snapshot(playlists, path)
+    return True
+
+
+class CatalogSnapshot:
+    """Read-only, zero-copy view of a snapshot file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is not a version {VERSION} catalog snapshot")
+
+        (magic, version, _, self._track_count, self._playlist_count, self._tracks_offset,
+         self._playlists_offset, self._entries_offset, self._strings_offset,
+         self.source_digest) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} catalog snapshot")
+
+    def __len__(self):
+        return self._track_count
+
+    def _string(self, offset, length):
+        start = self._strings_offset + offset
+        return self._map[start:start + length].decode("utf-8")
+
+    def _video_id(self, number):
+        start = self._tracks_offset + number * TRACK.size
+        return self._map[start:start + VIDEO_ID_LENGTH]
+
+    def track(self, number):
+        """Return track record `number` as {"url", "title"}"""
+        video_id, title_offset, title_length = TRACK.unpack_from(self._map, self._tracks_offset + number * TRACK.size)
+        return {
+            "url": f"https://www.youtube.com/watch?v={video_id.decode('ascii')}",
+            "title": self._string(title_offset, title_length)
+        }
+
+    def title(self, number):
+        _, title_offset, title_length = TRACK.unpack_from(self._map, self._tracks_offset + number * TRACK.size)
+        return self._string(title_offset, title_length)
+
+    def find_number(self, video_id):
+        """Binary search for a video ID, returns its track record number or None"""
+        key = video_id.encode("ascii", "ignore")
+        low, high = 0, self._track_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._video_id(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._track_count and self._video_id(low) == key:
+            return low
+        return None
+
+    def find(self, video_id):
+        """Look up a video ID, returns {"url", "title"} or None"""
+        number = self.find_number(video_id)
+        return None if number is None else self.track(number)
+
+    def tracks(self):
+        for number in range(self._track_count):
+            yield self.track(number)
+
+    def _playlist(self, index):
+        return PLAYLIST.unpack_from(self._map, self._playlists_offset + index * PLAYLIST.size)
+
+    def playlist_names(self):
+        """Playlist names in build order, without decoding any tracks"""
+        names = []
+        for index in range(self._playlist_count):
+            name_offset, name_length, _, _ = self._playlist(index)
+            names.append(self._string(name_offset, name_length))
+        return names
+
+    def playlist_tracks(self, index):
+        """Return playlist `index` (position in playlist_names()) as [{"url", "title"}]"""
+        _, _, count, first = self._playlist(index)
+        entries = struct.unpack_from(f"<{count}I", self._map, self._entries_offset + first * ENTRY.size)
+        return [self.track(number) for number in entries]
+
+    def playlists(self):
+        """Return {playlist name: [{"url", "title"}]} in build order"""
+        return {name: self.playlist_tracks(index) for index, name in enumerate(self.playlist_names())}
+
+
+class Catalog:
+    """Keeps the newest snapshot at `path` mapped, picking up atomic swaps"""
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = CatalogSnapshot(path)
+        self._checked_at = 0.0
+
+    @property
+    def snapshot(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                self._checked_at = now
+                try:
+                    stat = os.stat(self.path)
+                    if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._snapshot.signature:
+                        # Old mapping stays valid for readers still holding it
+                        self._snapshot = CatalogSnapshot(self.path)
+                except (OSError, ValueError):
+                    # Deleted or unreadable (e.g. mid-rebuild), keep serving the current one
+                    pass
+        return self._snapshot
+
+
+if __name__ == "__main__":
+    # python catalog_snapshot.py playlists.json [catalog.bin]
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python catalog_snapshot.py playlists.json [catalog.bin]")
+    with open(sys.argv[1]) as f:
+        source = json.load(f)
+    output = sys.argv[2] if len(sys.argv) == 3 else "catalog.bin"
+    build_snapshot(source, output)
+    snapshot = CatalogSnapshot(output)
+    # Precompute radio mode neighbours so app processes only have to map them
+    # (imported here so catalog readers don't load numpy and the radio module)
+    from radio import build_radio_index
+    build_radio_index(snapshot, output)
+    print(f"Wrote {len(snapshot)} tracks to {output}")
@@ -1,8 +1,63 @@
 import streamlit as st
-import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
 import os
+import io
+import re
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from user_store import MIN_PASSWORD_LENGTH, UserStore, hash_password
+
+CONFIG_PATH = "config.yaml"
+
+# Batch provisioning helpers
+def read_users_csv(text):
+    """Parse a CSV with username, name, email and password columns"""
+    reader = csv.DictReader(io.StringIO(text))
+    missing = {"username", "email", "password"} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+    return [{key: (value or "").strip() for key, value in row.items() if key} for row in reader]
+
+def validate_users(store, rows):
+    """Split CSV rows into users to create and (row number, username, reason) errors"""
+    valid, errors = [], []
+    seen_usernames, seen_emails = set(), set()
+    for line, row in enumerate(rows, start=2):
+        username, email, password = row["username"], row["email"], row["password"]
+        if not username or not email or not password:
+            errors.append((line, username, "Username, email and password are required"))
+        elif not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            errors.append((line, username, "Invalid email address"))
+        elif len(password) < MIN_PASSWORD_LENGTH:
+            errors.append((line, username, f"Password must be at least {MIN_PASSWORD_LENGTH} characters long"))
+        elif username in seen_usernames or store.has_username(username):
+            errors.append((line, username, "Username already exists"))
+        elif email in seen_emails or store.has_email(email):
+            errors.append((line, username, "Email already exists"))
+        else:
+            seen_usernames.add(username)
+            seen_emails.add(email)
+            valid.append({
+                "username": username,
+                "name": row.get("name") or username,
+                "email": email,
+                "password": password
+            })
+    return valid, errors
+
+def available_cores():
+    """Cores this process may run on (its affinity mask, not every core on the host)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def hash_passwords(users, on_progress):
+    """Replace plain passwords with bcrypt hashes using one process per available core"""
+    with ProcessPoolExecutor(max_workers=available_cores()) as executor:
+        futures = {executor.submit(hash_password, user["password"]): user for user in users}
+        for done, future in enumerate(as_completed(futures), start=1):
+            futures[future]["password"] = future.result()
+            on_progress(done, len(users))
 
 st.title("ClassicsAI Password Generator")
 
@@ -18,53 +73,86 @@ with st.form("password_form"):
     if submitted:
         if password != confirm_password:
             st.error("Passwords do not match!")
+        elif len(password) < MIN_PASSWORD_LENGTH:
+            st.error(f"Password must be at least {MIN_PASSWORD_LENGTH} characters long")
         else:
             # Generate password hash
-            hashed_password = stauth.Hasher([password]).generate()[0]
-            
-            st.success(f"Password hash generated successfully!")
-            st.code(f"""
-username: {username}
-  email: {email}
-  name: {name}
-  password: {hashed_password}
+            st.session_state.generated_user = {
+                "username": username,
+                "name": name,
+                "email": email,
+                "password": hash_password(password)
+            }
+
+# Shown outside the form so the "Add to config.yaml" button survives the rerun
+if "generated_user" in st.session_state:
+    user = st.session_state.generated_user
+    
+    st.success(f"Password hash generated successfully!")
+    st.code(f"""
+username: {user["username"]}
+  email: {user["email"]}
+  name: {user["name"]}
+  password: {user["password"]}
 """)
+    
+    # Option to add to config file
+    if st.button("Add to config.yaml"):
+        if os.path.exists(CONFIG_PATH):
+            # Appended to the journal, no config.yaml rewrite for a single user
+            success, message = UserStore(CONFIG_PATH).add_user(user["username"], user["email"],
+                                                               user["name"], user["password"])
+            if success:
+                st.success(f"User {user['username']} added to config.yaml!")
+                del st.session_state.generated_user
+            else:
+                st.error(f"{message} in config.yaml: {user['username']}")
+        else:
+            st.error("config.yaml not found!")
+
+st.header("Batch Provisioning")
+st.write("Upload a CSV with `username`, `name`, `email` and `password` columns to add many users at once.")
+
+users_file = st.file_uploader("Users CSV", type="csv")
+if users_file is not None and st.button("Provision Users"):
+    if not os.path.exists(CONFIG_PATH):
+        st.error("config.yaml not found!")
+    else:
+        store = UserStore(CONFIG_PATH)
+        try:
+            rows = read_users_csv(users_file.getvalue().decode("utf-8-sig"))
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"Could not read CSV: {e}")
+            rows = []
+        
+        # Reject duplicates before spending any time on bcrypt
+        users, errors = validate_users(store, rows)
+        
+        if users:
+            start_time = time.time()
+            progress_bar = st.progress(0.0, text=f"Hashing passwords on {available_cores()} cores...")
+            hash_passwords(users, lambda done, total: progress_bar.progress(
+                done / total, text=f"Hashed {done}/{total} passwords"))
             
-            # Option to add to config file
-            if st.button("Add to config.yaml"):
-                config_path = "config.yaml"
-                
-                if os.path.exists(config_path):
-                    with open(config_path) as file:
-                        config = yaml.load(file, Loader=SafeLoader)
-                    
-                    # Add new user
-                    if username not in config["credentials"]["usernames"]:
-                        config["credentials"]["usernames"][username] = {
-                            "email": email,
-                            "name": name,
-                            "password": hashed_password
-                        }
-                        
-                        # Add to preauthorized emails
-                        if email not in config["preauthorized"]["emails"]:
-                            config["preauthorized"]["emails"].append(email)
-                        
-                        with open(config_path, 'w') as file:
-                            yaml.dump(config, file, default_flow_style=False)
-                        
-                        st.success(f"User {username} added to config.yaml!")
-                    else:
-                        st.error(f"Username {username} already exists in config.yaml!")
-                else:
-                    st.error("config.yaml not found!")
+            # Single atomic write of config.yaml for the whole batch
+            added, skipped = store.add_users(users)
+            errors.extend((None, skipped_username, reason) for skipped_username, reason in skipped)
+            st.success(f"Added {len(added)} user(s) to config.yaml in {time.time() - start_time:.1f}s")
+        
+        if errors:
+            st.warning(f"Skipped {len(errors)} row(s)")
+            st.table([{"Line": line or "", "Username": error_username, "Reason": reason}
+                      for line, error_username, reason in errors])
+        elif not users:
+            st.info("No users found in the CSV")
 
 st.markdown("""
 ### Instructions
 1. Enter a username, name, email, and password
 2. Click "Generate Password Hash" to create a secure hash
-3. Click "Add to config.yaml" to add the user to the configuration file
-4. The default admin account is:
+3. Click "Add to config.yaml" to add the user (it goes to `config.yaml.journal` until the next `python user_store.py`)
+4. To add many users at once, upload a CSV under "Batch Provisioning" and click "Provision Users"
+5. The default admin account is:
    - Username: admin
    - Password: admin123
-""") 
\ No newline at end of file
+""")
\ No newline at end of file
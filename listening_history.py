@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import heapq
+import atexit
+import threading
+from collections import Counter, defaultdict
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single process only
+    fcntl = None
+
+
+# Append-only listening history with incrementally maintained rollups.
+#
+# Play events are buffered and appended to a JSON-lines log in batches (one
+# write + fsync per batch). Rollups are only ever updated by reading the log
+# forward from the last applied offset, so events written by other server
+# processes are counted exactly once. A snapshot of the rollups and the log
+# offset they cover is saved periodically, so startup only replays the tail.
+# The most played tracks (globally and per user) are kept as short ranked
+# lists updated on every play, so the Stats tab never sorts all counters.
+
+EVENTS = ("start", "end", "skip", "ended")
+SKIP_BUCKETS = 10
+# Length of the maintained top track lists
+TOP_TRACKS = 10
+
+
+class ListeningHistory:
+    def __init__(self, log_path="listening_history.jsonl", rollup_path="listening_rollups.json",
+                 batch_size=64, flush_interval=5.0, snapshot_every=1000):
+        self.log_path = log_path
+        self.rollup_path = rollup_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.time()
+        self._load_rollups()
+        self._replay()
+        atexit.register(self.flush)
+
+    # Rollups
+
+    def _reset_rollups(self):
+        self._offset = 0
+        self._applied_since_snapshot = 0
+        self._titles = {}
+        self._plays = Counter()
+        self._user_plays = defaultdict(Counter)
+        self._completions = Counter()
+        self._skips = Counter()
+        self._skip_points = defaultdict(lambda: [0] * SKIP_BUCKETS)
+        self._top = []
+        self._user_top = defaultdict(list)
+
+    def _load_rollups(self):
+        self._reset_rollups()
+        try:
+            with open(self.rollup_path) as f:
+                data = json.load(f)
+            self._offset = data["offset"]
+            self._titles = data["titles"]
+            self._plays = Counter(data["plays"])
+            for username, plays in data["user_plays"].items():
+                self._user_plays[username] = Counter(plays)
+            self._completions = Counter(data["completions"])
+            self._skips = Counter(data["skips"])
+            self._skip_points.update(data["skip_points"])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Unreadable snapshot, rebuild everything from the log instead
+            self._reset_rollups()
+            return
+        self._top = self._ranked(self._plays)
+        for username, plays in self._user_plays.items():
+            self._user_top[username] = self._ranked(plays)
+
+    @staticmethod
+    def _ranked(counter):
+        return [video_id for video_id, _ in heapq.nlargest(TOP_TRACKS, counter.items(), key=lambda item: item[1])]
+
+    @staticmethod
+    def _bump_top(top, counter, video_id):
+        """Keep `top` ranked after counter[video_id] went up by one
+
+        Counts only ever grow, so a track can only enter the list by
+        overtaking its last entry.
+        """
+        if video_id not in top:
+            if len(top) < TOP_TRACKS:
+                top.append(video_id)
+            elif counter[video_id] > counter[top[-1]]:
+                top[-1] = video_id
+            else:
+                return
+        top.sort(key=counter.__getitem__, reverse=True)
+
+    def _save_rollups(self):
+        data = {
+            "offset": self._offset,
+            "titles": self._titles,
+            "plays": self._plays,
+            "user_plays": self._user_plays,
+            "completions": self._completions,
+            "skips": self._skips,
+            "skip_points": self._skip_points
+        }
+        tmp_path = f"{self.rollup_path}.{os.getpid()}.tmp"
+        with open(f"{self.rollup_path}.lock", "a") as lock:
+            # One process at a time swaps its snapshot in
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.rollup_path)
+        self._applied_since_snapshot = 0
+
+    def _apply(self, event):
+        video_id = event["video_id"]
+        if event.get("title"):
+            self._titles[video_id] = event["title"]
+
+        kind = event["event"]
+        if kind == "start":
+            self._plays[video_id] += 1
+            self._bump_top(self._top, self._plays, video_id)
+            username = event.get("username")
+            if username:
+                self._user_plays[username][video_id] += 1
+                self._bump_top(self._user_top[username], self._user_plays[username], video_id)
+        elif kind == "ended":
+            self._completions[video_id] += 1
+        elif kind == "skip":
+            self._skips[video_id] += 1
+            position, duration = event.get("position"), event.get("duration")
+            if position is not None and duration:
+                bucket = min(SKIP_BUCKETS - 1, int(SKIP_BUCKETS * position / duration))
+                self._skip_points[video_id][bucket] += 1
+
+    def _replay(self):
+        """Apply log lines written since the last applied offset"""
+        if not os.path.exists(self.log_path):
+            return
+        if os.path.getsize(self.log_path) < self._offset:
+            # Log was rotated or truncated, rebuild from scratch
+            self._reset_rollups()
+        with open(self.log_path, "rb") as log:
+            log.seek(self._offset)
+            for line in log:
+                if not line.endswith(b"\n"):
+                    break  # batch still being written
+                self._offset += len(line)
+                self._apply(json.loads(line))
+                self._applied_since_snapshot += 1
+        if self._applied_since_snapshot >= self.snapshot_every:
+            self._save_rollups()
+
+    # Writing
+
+    def record(self, event, username, video_id, title=None, position=None, duration=None):
+        """Queue a play event, flushing the batch when it is full or old enough"""
+        if event not in EVENTS:
+            raise ValueError(f"Unknown play event: {event}")
+        entry = {
+            "ts": round(time.time(), 3),
+            "event": event,
+            "username": username,
+            "video_id": video_id,
+            "title": title,
+            "position": None if position is None else round(position, 1),
+            "duration": duration
+        }
+        with self._lock:
+            self._buffer.append(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._flush_if_due()
+
+    def _flush_if_due(self):
+        due = (len(self._buffer) >= self.batch_size
+               or time.time() - self._last_flush >= self.flush_interval)
+        if due:
+            self._flush()
+        else:
+            self._replay()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            data = "".join(self._buffer).encode("utf-8")
+            # O_APPEND keeps batches from concurrent processes intact
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._buffer = []
+        self._last_flush = time.time()
+        self._replay()
+
+    # Queries (read precomputed rollups, never the raw log)
+
+    def _top_entries(self, counter, video_ids):
+        return [
+            {
+                "video_id": video_id,
+                "title": self._titles.get(video_id, video_id),
+                "plays": plays,
+                "completion_rate": self._completion_rate(video_id)
+            }
+            for video_id, plays in ((video_id, counter[video_id]) for video_id in video_ids)
+        ]
+
+    def _completion_rate(self, video_id):
+        plays = self._plays.get(video_id, 0)
+        return min(1.0, self._completions.get(video_id, 0) / plays) if plays else 0.0
+
+    def top_tracks(self, n=10, username=None):
+        """Most played tracks, globally or for one user"""
+        with self._lock:
+            self._flush_if_due()
+            if username:
+                counter = self._user_plays.get(username, Counter())
+                top = self._user_top.get(username, [])
+            else:
+                counter, top = self._plays, self._top
+            if n > TOP_TRACKS:
+                top = [video_id for video_id, _ in heapq.nlargest(n, counter.items(), key=lambda item: item[1])]
+            return self._top_entries(counter, top[:n])
+
+    def completion_rate(self, video_id):
+        with self._lock:
+            self._flush_if_due()
+            return self._completion_rate(video_id)
+
+    def skip_points(self, video_id):
+        """Skip counts per tenth of the track duration"""
+        with self._lock:
+            self._flush_if_due()
+            return list(self._skip_points.get(video_id, [0] * SKIP_BUCKETS))
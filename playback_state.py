@@ -0,0 +1,80 @@
+import os
+import json
+import atexit
+import threading
+from urllib.parse import quote
+
+
+# Per-user playback snapshots so listeners keep their place across browser
+# reconnects and server restarts.
+#
+# Each user has one small JSON file holding the queue (as compact
+# [video_id, title] pairs, so nothing has to be re-parsed or re-fetched on
+# resume), the track index, position and player settings. Saves only update
+# memory; dirty snapshots are written out once `coalesce_delay` seconds after
+# the first change, so a burst of Next clicks costs a single write. Only
+# unwritten snapshots are kept in memory: loads read the file, so a listener
+# who reconnects to another server process still gets their latest state.
+
+class PlaybackStateStore:
+    def __init__(self, directory="playback_state", coalesce_delay=2.0):
+        self.directory = directory
+        self.coalesce_delay = coalesce_delay
+        self._lock = threading.Lock()
+        # Snapshots saved but not written yet, by username
+        self._dirty = {}
+        self._timer = None
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.flush)
+
+    def _path(self, username):
+        return os.path.join(self.directory, f"{quote(username, safe='')}.json")
+
+    def load(self, username):
+        """Return the last saved snapshot for a user, or None"""
+        with self._lock:
+            if username in self._dirty:
+                return self._dirty[username]
+            try:
+                with open(self._path(username)) as f:
+                    return json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+
+    def save(self, username, snapshot):
+        """Remember a snapshot and schedule a coalesced write"""
+        with self._lock:
+            self._dirty[username] = snapshot
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.coalesce_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write all dirty snapshots to disk
+
+        Snapshots that fail to write stay dirty and are retried on the next
+        flush; the first error is re-raised.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            error = None
+            for username, snapshot in list(self._dirty.items()):
+                path = self._path(username)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                try:
+                    with open(tmp_path, "w") as f:
+                        json.dump(snapshot, f, separators=(",", ":"))
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    error = error or e
+                    continue
+                del self._dirty[username]
+            if error is not None:
+                self._schedule()
+                raise error
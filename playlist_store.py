@@ -0,0 +1,401 @@
+import os
+import json
+import uuid
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single process only
+    fcntl = None
+
+
+# User playlists stored as an append-only log of single-record operations.
+#
+# Every track has a stable ID, a fractional ordering key and a version. Order
+# is given by sorting on the key, so inserting, moving or removing a track
+# writes one log line for that track instead of rewriting the list. Edits name
+# the track ID and the version the caller last saw; if another session changed
+# or removed that track in the meantime the edit is rejected with
+# PlaylistConflict instead of silently hitting the wrong track. Edits to
+# different tracks never conflict. The log is compacted once it is mostly
+# superseded records.
+
+KEY_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+KEY_BASE = len(KEY_DIGITS)
+# Integer part of the smallest possible key
+SMALLEST_INTEGER = "A" + KEY_DIGITS[0] * 26
+
+
+class PlaylistError(Exception):
+    pass
+
+
+class PlaylistConflict(PlaylistError):
+    pass
+
+
+# Ordering keys are an integer part followed by an optional fraction, both in
+# base 62. The first character of the integer part gives its length ("a0".."az"
+# has one digit, "b00" two, ...; "A".."Z" are the negatives), so appending just
+# increments the integer and key length grows with the log of the playlist
+# length. Inserting between two neighbours falls back to the fraction.
+
+def _integer_length(head):
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid ordering key head: {head!r}")
+
+
+def _split_key(key):
+    if not key:
+        raise ValueError("Empty ordering key")
+    length = _integer_length(key[0])
+    if length > len(key) or key == SMALLEST_INTEGER:
+        raise ValueError(f"Invalid ordering key: {key!r}")
+    integer, fraction = key[:length], key[length:]
+    if fraction.endswith(KEY_DIGITS[0]):
+        raise ValueError(f"Invalid ordering key: {key!r}")
+    return integer, fraction
+
+
+def _increment_integer(integer):
+    """Next integer part, or None past the largest one"""
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = KEY_DIGITS.index(digits[i]) + 1
+        if value < KEY_BASE:
+            digits[i] = KEY_DIGITS[value]
+            return head + "".join(digits)
+        digits[i] = KEY_DIGITS[0]
+    # Carried out of every digit: move to the next length
+    if head == "Z":
+        return "a" + KEY_DIGITS[0]
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(KEY_DIGITS[0])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _decrement_integer(integer):
+    """Previous integer part, or None below the smallest one"""
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = KEY_DIGITS.index(digits[i]) - 1
+        if value >= 0:
+            digits[i] = KEY_DIGITS[value]
+            return head + "".join(digits)
+        digits[i] = KEY_DIGITS[-1]
+    if head == "a":
+        return "Z" + KEY_DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(KEY_DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _fraction_between(lower, upper):
+    """Fraction strictly between two fractions (upper None for no bound)"""
+    if upper is not None:
+        # Keep the common prefix and look for room after it
+        n = 0
+        while (lower[n] if n < len(lower) else KEY_DIGITS[0]) == upper[n]:
+            n += 1
+        if n > 0:
+            return upper[:n] + _fraction_between(lower[n:], upper[n:])
+    low = KEY_DIGITS.index(lower[0]) if lower else 0
+    high = KEY_DIGITS.index(upper[0]) if upper is not None else KEY_BASE
+    if high - low > 1:
+        return KEY_DIGITS[(low + high + 1) // 2]
+    # Adjacent digits
+    if upper is not None and len(upper) > 1:
+        return upper[0]
+    return KEY_DIGITS[low] + _fraction_between(lower[1:], None)
+
+
+def key_between(lower, upper):
+    """Return an ordering key that sorts strictly between lower and upper
+
+    Either bound may be None for an open end.
+    """
+    if lower is not None and upper is not None and lower >= upper:
+        raise ValueError(f"{lower!r} must sort before {upper!r}")
+    if lower is None and upper is None:
+        return "a" + KEY_DIGITS[0]
+    if lower is None:
+        integer, fraction = _split_key(upper)
+        if integer == SMALLEST_INTEGER:
+            return integer + _fraction_between("", fraction)
+        if fraction:
+            return integer
+        previous = _decrement_integer(integer)
+        if previous is None:
+            raise ValueError("Ran out of ordering keys")
+        return previous
+    integer, fraction = _split_key(lower)
+    if upper is None:
+        following = _increment_integer(integer)
+        return following if following is not None else integer + _fraction_between(fraction, None)
+    upper_integer, upper_fraction = _split_key(upper)
+    if integer == upper_integer:
+        return integer + _fraction_between(fraction, upper_fraction)
+    following = _increment_integer(integer)
+    if following is None:
+        raise ValueError("Ran out of ordering keys")
+    if following < upper:
+        return following
+    return integer + _fraction_between(fraction, None)
+
+
+class PlaylistStore:
+    def __init__(self, log_path="playlists.log", legacy_path="playlists.json"):
+        self.log_path = log_path
+        self._lock = threading.RLock()
+        if not os.path.exists(log_path):
+            if legacy_path and os.path.exists(legacy_path):
+                self._import_legacy(legacy_path)
+            else:
+                self._rewrite_log([])
+        self._load()
+
+    # Loading
+
+    def _import_legacy(self, legacy_path):
+        """Convert the old {name: [{"url", "title"}]} playlists.json once"""
+        with open(legacy_path) as f:
+            playlists = json.load(f)
+        lines = []
+        for name, tracks in playlists.items():
+            lines.append({"op": "create", "playlist": name})
+            key = None
+            for track in tracks:
+                key = key_between(key, None)
+                lines.append(self._put_entry(name, uuid.uuid4().hex, key, track["url"], track["title"], 1))
+        self._rewrite_log(lines)
+
+    def _load(self):
+        self._playlists = {}
+        self._sorted = {}
+        self._offset = 0
+        self._entries = 0
+        self._generation = None
+        self._replay()
+
+    def _replay(self):
+        """Apply log lines written since the last read (by any process)"""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as log:
+            log.seek(self._offset)
+            for line in log:
+                if not line.endswith(b"\n"):
+                    break  # partially written line, pick it up next time
+                self._offset += len(line)
+                self._entries += 1
+                self._apply(json.loads(line))
+
+    def _refresh(self):
+        """Catch up with edits made by other sessions and processes"""
+        with open(self.log_path, "rb") as log:
+            header = json.loads(log.readline())
+            size = os.fstat(log.fileno()).st_size
+        if header["generation"] != self._generation or size < self._offset:
+            # Log was compacted by another process, start over
+            self._load()
+        elif size > self._offset:
+            self._replay()
+
+    def _apply(self, entry):
+        op = entry["op"]
+        if op == "header":
+            self._generation = entry["generation"]
+            return
+        name = entry["playlist"]
+        if op == "create":
+            self._playlists.setdefault(name, {})
+        elif op == "delete":
+            self._playlists.pop(name, None)
+        elif op == "put":
+            self._playlists.setdefault(name, {})[entry["id"]] = {
+                "id": entry["id"],
+                "key": entry["key"],
+                "url": entry["url"],
+                "title": entry["title"],
+                "version": entry["version"]
+            }
+        elif op == "remove":
+            self._playlists.get(name, {}).pop(entry["id"], None)
+        self._sorted.pop(name, None)
+
+    # Reading
+
+    def _ordered(self, name):
+        if name not in self._sorted:
+            tracks = self._playlists[name].values()
+            self._sorted[name] = sorted(tracks, key=lambda track: (track["key"], track["id"]))
+        return self._sorted[name]
+
+    def playlists(self):
+        """Return {name: [track]} with tracks in order; treat the result as read-only"""
+        with self._lock:
+            self._refresh()
+            return {name: list(self._ordered(name)) for name in self._playlists}
+
+    def tracks(self, name):
+        with self._lock:
+            self._refresh()
+            if name not in self._playlists:
+                raise PlaylistError(f"Playlist '{name}' does not exist")
+            return list(self._ordered(name))
+
+    def __contains__(self, name):
+        return name in self._playlists
+
+    # Writing
+
+    @staticmethod
+    def _put_entry(name, track_id, key, url, title, version):
+        return {"op": "put", "playlist": name, "id": track_id, "key": key,
+                "url": url, "title": title, "version": version}
+
+    def _edit(self, build_entries):
+        """Run build_entries() on fresh state under the log lock and append its result"""
+        with self._lock:
+            log = self._locked_log()
+            try:
+                self._refresh()
+                entries, result = build_entries()
+                data = b"".join((json.dumps(entry) + "\n").encode("utf-8") for entry in entries)
+                log.write(data)
+                log.flush()
+                os.fsync(log.fileno())
+                self._replay()
+                if self._entries > 1000 and self._entries > 4 * self._live_records():
+                    self._compact()
+                return result
+            finally:
+                log.close()
+
+    def _locked_log(self):
+        while True:
+            log = open(self.log_path, "ab")
+            if fcntl is None:
+                return log
+            fcntl.flock(log, fcntl.LOCK_EX)
+            # A compaction may have replaced the file while we waited for the lock
+            if os.path.samestat(os.stat(self.log_path), os.fstat(log.fileno())):
+                return log
+            log.close()
+
+    def _live_records(self):
+        return len(self._playlists) + sum(len(tracks) for tracks in self._playlists.values())
+
+    def _track(self, name, track_id, expected_version):
+        if name not in self._playlists:
+            raise PlaylistConflict(f"Playlist '{name}' was deleted")
+        track = self._playlists[name].get(track_id)
+        if track is None:
+            raise PlaylistConflict("That track was already removed")
+        if track["version"] != expected_version:
+            raise PlaylistConflict("That track was changed in another session")
+        return track
+
+    def create(self, name):
+        def build():
+            if name in self._playlists:
+                raise PlaylistError(f"Playlist '{name}' already exists")
+            return [{"op": "create", "playlist": name}], name
+        return self._edit(build)
+
+    def delete(self, name):
+        def build():
+            if name not in self._playlists:
+                raise PlaylistConflict(f"Playlist '{name}' was already deleted")
+            return [{"op": "delete", "playlist": name}], name
+        return self._edit(build)
+
+    def add_tracks(self, name, tracks, create=False):
+        """Append {"url", "title"} tracks, returns the stored track records
+
+        With `create` the playlist is created in the same write and must not
+        exist yet.
+        """
+        def build():
+            entries = []
+            if create:
+                if name in self._playlists:
+                    raise PlaylistError(f"Playlist '{name}' already exists")
+                entries.append({"op": "create", "playlist": name})
+            elif name not in self._playlists:
+                raise PlaylistConflict(f"Playlist '{name}' was deleted")
+            ordered = self._ordered(name) if name in self._playlists else []
+            key = ordered[-1]["key"] if ordered else None
+            for track in tracks:
+                key = key_between(key, None)
+                entries.append(self._put_entry(name, uuid.uuid4().hex, key, track["url"], track["title"], 1))
+            return entries, [entry for entry in entries if entry["op"] == "put"]
+        return self._edit(build)
+
+    def add_track(self, name, url, title):
+        return self.add_tracks(name, [{"url": url, "title": title}])[0]
+
+    def move_track(self, name, track_id, expected_version, after_track_id=None):
+        """Move a track right after `after_track_id` (None moves it to the front)"""
+        def build():
+            track = self._track(name, track_id, expected_version)
+            others = [other for other in self._ordered(name) if other["id"] != track_id]
+            if after_track_id is None:
+                position = 0
+            else:
+                positions = [i for i, other in enumerate(others) if other["id"] == after_track_id]
+                if not positions:
+                    raise PlaylistConflict("The neighbouring track was removed in another session")
+                position = positions[0] + 1
+            lower = others[position - 1]["key"] if position > 0 else None
+            upper = others[position]["key"] if position < len(others) else None
+            if lower is not None and upper is not None and lower >= upper:
+                raise PlaylistConflict("Tracks were reordered concurrently, please try again")
+            entry = self._put_entry(name, track_id, key_between(lower, upper),
+                                    track["url"], track["title"], track["version"] + 1)
+            return [entry], entry
+        return self._edit(build)
+
+    def remove_track(self, name, track_id, expected_version):
+        def build():
+            self._track(name, track_id, expected_version)
+            return [{"op": "remove", "playlist": name, "id": track_id}], track_id
+        return self._edit(build)
+
+    # Compaction
+
+    def _rewrite_log(self, entries):
+        # Each rewrite gets a new generation so readers can tell it apart from
+        # the file it replaced (inode numbers get reused)
+        header = {"op": "header", "generation": uuid.uuid4().hex}
+        tmp_path = f"{self.log_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            for entry in [header] + entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_path)
+
+    def _compact(self):
+        # Caller holds the log lock; other processes see a new inode and reload
+        entries = []
+        for name in self._playlists:
+            entries.append({"op": "create", "playlist": name})
+            for track in self._ordered(name):
+                entries.append(self._put_entry(name, track["id"], track["key"], track["url"],
+                                               track["title"], track["version"]))
+        self._rewrite_log(entries)
+        self._load()
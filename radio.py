@@ -0,0 +1,372 @@
+import os
+import re
+import zlib
+import threading
+from collections import deque
+
+import numpy as np
+
+from catalog_snapshot import track_video_id
+
+
+# Similarity index behind "radio" mode.
+#
+# Every track is turned into a hashed, L2-normalised feature vector built from
+# its composer, instrument, work number and title tokens. The top neighbours of
+# each track are precomputed and kept up to date as tracks are added, so
+# building a radio queue is just a walk over short neighbour lists.
+#
+# The index covers a catalog snapshot plus tracks added later (user playlists,
+# shared links). Catalog tracks are rows 0..len(snapshot)-1, the same numbers
+# as their snapshot records, so their titles are read from the shared mmap
+# instead of being copied into every process. Added tracks get the rows after.
+#
+# The catalog part is computed once per snapshot (build_radio_index, run by
+# catalog_snapshot.py or on first use) and saved as .npy files next to it.
+# Processes map those read-only, so they share one page-cache copy and opening
+# the index costs the same at 50 or 100k tracks. Added tracks, and catalog
+# neighbour lists they displace, live in process memory.
+
+FEATURE_DIM = 128
+NEIGHBOURS = 16
+# Max number of existing tracks compared against a newly added one
+CANDIDATE_LIMIT = 1024
+
+ARRAYS = ("vectors", "neighbours", "scores", "bucket_keys", "bucket_starts", "bucket_rows")
+
+INSTRUMENTS = {
+    "piano", "violin", "viola", "cello", "flute", "oboe", "clarinet", "bassoon",
+    "horn", "trumpet", "guitar", "harp", "harpsichord", "organ", "orchestra"
+}
+STOPWORDS = {"new", "the", "of", "in", "and", "a", "an", "no", "op", "for"}
+
+def track_features(title):
+    """Map a title such as "Beethoven - New Piano Concerto 30" to weighted feature tokens"""
+    features = {}
+    lowered = title.lower()
+
+    if " - " in lowered:
+        composer, rest = lowered.split(" - ", 1)
+        features[f"composer:{composer.strip()}"] = 3.0
+    else:
+        rest = lowered
+
+    for word in re.findall(r"[a-z]+", rest):
+        if word in STOPWORDS:
+            continue
+        if word in INSTRUMENTS:
+            features[f"instrument:{word}"] = 2.0
+        else:
+            features[f"token:{word}"] = 1.0
+
+    numbers = re.findall(r"\d+", rest)
+    if numbers:
+        work = int(numbers[-1])
+        features[f"work:{work}"] = 1.0
+        # Neighbouring work numbers share a bucket so No. 25 sits near No. 27
+        features[f"work_range:{work // 5}"] = 0.5
+
+    return features
+
+
+def feature_vector(features):
+    vector = np.zeros(FEATURE_DIM, dtype=np.float32)
+    for name, weight in features.items():
+        vector[zlib.crc32(name.encode("utf-8")) % FEATURE_DIM] += weight
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def _bucket_hash(key):
+    return zlib.crc32(key.encode("utf-8"))
+
+
+def _empty_arrays():
+    return {
+        "vectors": np.zeros((0, FEATURE_DIM), dtype=np.float32),
+        "neighbours": np.zeros((0, NEIGHBOURS), dtype=np.int32),
+        "scores": np.zeros((0, NEIGHBOURS), dtype=np.float32),
+        "bucket_keys": np.zeros(0, dtype=np.uint32),
+        "bucket_starts": np.zeros(1, dtype=np.int64),
+        "bucket_rows": np.zeros(0, dtype=np.int32)
+    }
+
+
+def radio_index_paths(snapshot_path, snapshot):
+    """.npy files holding the precomputed index of a snapshot, by array name"""
+    directory = f"{snapshot_path}.radio"
+    prefix = snapshot.source_digest.hex()
+    return {name: os.path.join(directory, f"{prefix}-{name}.npy") for name in ARRAYS}
+
+
+def build_radio_index(snapshot, snapshot_path):
+    """Precompute the index for a catalog snapshot and save it next to the snapshot"""
+    paths = radio_index_paths(snapshot_path, snapshot)
+    directory = os.path.dirname(paths["vectors"])
+    os.makedirs(directory, exist_ok=True)
+    for name, array in RadioIndex(snapshot)._export().items():
+        tmp_path = f"{paths[name]}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, paths[name])
+    # Indexes of older snapshots (processes still mapping them keep their copy)
+    current = {os.path.basename(path) for path in paths.values()}
+    for filename in os.listdir(directory):
+        if filename.endswith(".npy") and filename not in current:
+            os.remove(os.path.join(directory, filename))
+
+
+class RadioIndex:
+    def __init__(self, snapshot, arrays=None, capacity=1024):
+        """Index `snapshot`, using precomputed `arrays` for its tracks if given
+
+        Without arrays the whole catalog is indexed in memory, which is how
+        build_radio_index computes them; use RadioIndex.open() in the app.
+        """
+        self._lock = threading.Lock()
+        self._snapshot = snapshot
+        self._catalog_size = len(snapshot)
+        # Rows below _base_size come from the (read-only) precomputed arrays
+        self._base = arrays if arrays is not None else _empty_arrays()
+        self._base_size = len(self._base["vectors"])
+        # Copy-on-write neighbour lists of base rows displaced by added tracks
+        self._patched = {}
+        # Tracks added on top of the catalog, by row - catalog size
+        self._tracks = []
+        self._rows = {}
+        # Candidate buckets of in-memory rows keyed by composer/instrument, most specific first
+        self._buckets = {}
+        capacity = max(capacity, self._catalog_size - self._base_size)
+        self._vectors = np.zeros((capacity, FEATURE_DIM), dtype=np.float32)
+        self._neighbours = np.full((capacity, NEIGHBOURS), -1, dtype=np.int32)
+        self._scores = np.full((capacity, NEIGHBOURS), -np.inf, dtype=np.float32)
+        self._size = self._base_size
+        for number in range(self._base_size, self._catalog_size):
+            self._index(snapshot.title(number))
+
+    @classmethod
+    def open(cls, snapshot, snapshot_path):
+        """Map the index saved for `snapshot`, building it first if it is missing"""
+        paths = radio_index_paths(snapshot_path, snapshot)
+        try:
+            arrays = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+            if len(arrays["vectors"]) != len(snapshot):
+                raise ValueError("radio index does not match the snapshot")
+        except (OSError, ValueError):
+            build_radio_index(snapshot, snapshot_path)
+            arrays = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+        return cls(snapshot, arrays)
+
+    def _export(self):
+        """Arrays for all rows, in the layout RadioIndex(snapshot, arrays) expects"""
+        if self._base_size or self._patched:
+            raise ValueError("only an in-memory index can be exported")
+        buckets = {}
+        for key, rows in self._buckets.items():
+            buckets.setdefault(_bucket_hash(key), []).extend(rows)
+        keys = sorted(buckets)
+        rows = [sorted(buckets[key]) for key in keys]
+        return {
+            "vectors": self._vectors[:self._size],
+            "neighbours": self._neighbours[:self._size],
+            "scores": self._scores[:self._size],
+            "bucket_keys": np.array(keys, dtype=np.uint32),
+            "bucket_starts": np.cumsum([0] + [len(bucket) for bucket in rows], dtype=np.int64),
+            "bucket_rows": np.array([row for bucket in rows for row in bucket], dtype=np.int32)
+        }
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, video_id):
+        return self._row(video_id) is not None
+
+    def _row(self, video_id):
+        row = self._rows.get(video_id)
+        if row is None:
+            row = self._snapshot.find_number(video_id)
+        return row
+
+    def _track(self, row):
+        if row < self._catalog_size:
+            return self._snapshot.track(row)
+        return self._tracks[row - self._catalog_size]
+
+    # Row storage: base rows from the mapped arrays (or their patched copies),
+    # other rows from the in-memory arrays at row - _base_size
+
+    def _vectors_of(self, rows):
+        in_base = rows < self._base_size
+        vectors = np.empty((len(rows), FEATURE_DIM), dtype=np.float32)
+        vectors[in_base] = self._base["vectors"][rows[in_base]]
+        vectors[~in_base] = self._vectors[rows[~in_base] - self._base_size]
+        return vectors
+
+    def _scores_of(self, rows):
+        in_base = rows < self._base_size
+        scores = np.empty((len(rows), NEIGHBOURS), dtype=np.float32)
+        scores[in_base] = self._base["scores"][rows[in_base]]
+        scores[~in_base] = self._scores[rows[~in_base] - self._base_size]
+        if self._patched:
+            for i in np.flatnonzero(in_base):
+                patched = self._patched.get(int(rows[i]))
+                if patched is not None:
+                    scores[i] = patched[1]
+        return scores
+
+    def _lists(self, row):
+        """(neighbours, scores) of a row"""
+        if row >= self._base_size:
+            return self._neighbours[row - self._base_size], self._scores[row - self._base_size]
+        patched = self._patched.get(row)
+        if patched is not None:
+            return patched
+        return self._base["neighbours"][row], self._base["scores"][row]
+
+    def _writable_lists(self, row):
+        if row < self._base_size and row not in self._patched:
+            self._patched[row] = (np.array(self._base["neighbours"][row]), np.array(self._base["scores"][row]))
+        return self._lists(row)
+
+    def _grow(self):
+        capacity = self._vectors.shape[0] * 2
+        vectors = np.zeros((capacity, FEATURE_DIM), dtype=np.float32)
+        neighbours = np.full((capacity, NEIGHBOURS), -1, dtype=np.int32)
+        scores = np.full((capacity, NEIGHBOURS), -np.inf, dtype=np.float32)
+        count = self._size - self._base_size
+        vectors[:count] = self._vectors[:count]
+        neighbours[:count] = self._neighbours[:count]
+        scores[:count] = self._scores[:count]
+        self._vectors, self._neighbours, self._scores = vectors, neighbours, scores
+
+    @staticmethod
+    def _bucket_keys(features):
+        composers = [name for name in features if name.startswith("composer:")]
+        instruments = [name for name in features if name.startswith("instrument:")]
+        keys = [f"{composer}|{instrument}" for composer in composers for instrument in instruments]
+        return keys + composers + instruments
+
+    def _bucket(self, key):
+        rows = self._buckets.get(key, [])
+        keys = self._base["bucket_keys"]
+        if len(keys):
+            h = _bucket_hash(key)
+            i = int(np.searchsorted(keys, h))
+            if i < len(keys) and keys[i] == h:
+                starts = self._base["bucket_starts"]
+                base_rows = self._base["bucket_rows"][starts[i]:starts[i + 1]]
+                return np.concatenate([base_rows[-CANDIDATE_LIMIT:], np.array(rows, dtype=np.int32)])
+        return np.array(rows, dtype=np.int32)
+
+    def _candidates(self, keys):
+        # Compare against the newest tracks of the most specific bucket that is
+        # big enough, so adding a track costs the same at 100 or 100k tracks
+        for key in keys:
+            bucket = self._bucket(key)
+            if len(bucket) >= NEIGHBOURS:
+                return bucket[-CANDIDATE_LIMIT:]
+        count = self._size
+        return np.arange(max(0, count - CANDIDATE_LIMIT), count, dtype=np.int32)
+
+    def _index(self, title):
+        """Compute neighbours for the next row; caller holds the lock or is __init__"""
+        features = track_features(title)
+        vector = feature_vector(features)
+        keys = self._bucket_keys(features)
+
+        row = self._size
+        slot = row - self._base_size
+        if slot == self._vectors.shape[0]:
+            self._grow()
+
+        candidates = self._candidates(keys)
+        if len(candidates):
+            similarities = self._vectors_of(candidates) @ vector
+
+            # Neighbours of the new track
+            top = min(NEIGHBOURS, len(candidates))
+            best = np.argpartition(-similarities, top - 1)[:top]
+            self._neighbours[slot, :top] = candidates[best]
+            self._scores[slot, :top] = similarities[best]
+
+            # Let the new track displace the weakest neighbour of existing tracks
+            scores = self._scores_of(candidates)
+            weakest = scores.argmin(axis=1)
+            improved = similarities > scores[np.arange(len(candidates)), weakest]
+            rows = candidates[improved]
+            slots = weakest[improved]
+            in_memory = rows >= self._base_size
+            self._neighbours[rows[in_memory] - self._base_size, slots[in_memory]] = row
+            self._scores[rows[in_memory] - self._base_size, slots[in_memory]] = similarities[improved][in_memory]
+            for base_row, base_slot, similarity in zip(rows[~in_memory], slots[~in_memory],
+                                                       similarities[improved][~in_memory]):
+                neighbours, neighbour_scores = self._writable_lists(int(base_row))
+                neighbours[base_slot] = row
+                neighbour_scores[base_slot] = similarity
+
+        self._vectors[slot] = vector
+        for key in keys:
+            self._buckets.setdefault(key, []).append(row)
+        self._size += 1
+        return row
+
+    def add_track(self, track):
+        """Index a {"url", "title"} track, returns its video ID"""
+        video_id = track_video_id(track)
+        with self._lock:
+            if self._row(video_id) is not None:
+                return video_id
+            self._rows[video_id] = self._index(track["title"])
+            self._tracks.append({"url": track["url"], "title": track["title"]})
+            return video_id
+
+    def add_tracks(self, tracks):
+        for track in tracks:
+            self.add_track(track)
+
+    def get_track(self, video_id):
+        """Return the indexed {"url", "title"} track for a video ID, or None"""
+        row = self._row(video_id)
+        return None if row is None else self._track(row)
+
+    def neighbours(self, video_id):
+        """Return similar tracks for a video ID, most similar first"""
+        row = self._row(video_id)
+        if row is None:
+            return []
+        return [self._track(i) for i in self._sorted_neighbours(row)]
+
+    def _sorted_neighbours(self, row):
+        neighbours, scores = self._lists(row)
+        order = np.argsort(-scores)
+        return [int(i) for i in neighbours[order] if i >= 0]
+
+    def radio_queue(self, seed_track, length=50, exclude=()):
+        """Build a queue of up to `length` tracks similar to `seed_track`
+
+        Walks the precomputed neighbour lists breadth first from the seed, so
+        the cost depends on `length`, not on the size of the catalog.
+        """
+        seed_id = self.add_track(seed_track)
+        with self._lock:
+            excluded = {self._row(video_id) for video_id in exclude}
+            # Excluded tracks are still walked through, just not queued
+            seed_row = self._row(seed_id)
+            visited = {seed_row}
+            frontier = deque([seed_row])
+            queue = []
+            while frontier and len(queue) < length:
+                for neighbour in self._sorted_neighbours(frontier.popleft()):
+                    if neighbour in visited:
+                        continue
+                    visited.add(neighbour)
+                    frontier.append(neighbour)
+                    if neighbour not in excluded:
+                        queue.append(dict(self._track(neighbour)))
+                        if len(queue) >= length:
+                            break
+            return queue
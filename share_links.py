@@ -0,0 +1,131 @@
+import base64
+import struct
+import zlib
+
+
+# Compact playlist share links.
+#
+# YouTube video IDs are 11 characters from the same 64-symbol alphabet as
+# URL-safe base64, so each character carries 6 bits. Decoding the concatenated
+# IDs as base64 packs them at 66 bits (8.25 bytes) per video with no lookup
+# tables. A share token is laid out as:
+#
+#   version (1 byte) | flags (1 byte) | body | crc32 of everything before (4 bytes)
+#
+# where the body, optionally zlib-compressed, is
+#
+#   name length (1 byte) | name (UTF-8) | track count (2 bytes) | packed IDs
+#
+# and the whole thing is URL-safe base64 without padding, ready for a query
+# parameter. A 200-track playlist comes out at about 2.2k characters.
+
+SHARE_PARAM = "share"
+VERSION = 1
+FLAG_COMPRESSED = 0x01
+
+VIDEO_ID_LENGTH = 11
+MAX_TRACKS = 500
+MAX_NAME_BYTES = 255
+
+ALPHABET = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+class ShareLinkError(ValueError):
+    pass
+
+
+def _packed_length(count):
+    # Every 4 ID characters become 3 bytes
+    return 3 * -(-count * VIDEO_ID_LENGTH // 4)
+
+
+# Decoding refuses anything bigger than a maximal playlist could produce
+MAX_BODY_BYTES = 1 + MAX_NAME_BYTES + 2 + _packed_length(MAX_TRACKS)
+MAX_TOKEN_LENGTH = -(-(2 + MAX_BODY_BYTES + 4) // 3) * 4
+
+
+def _pack_ids(video_ids):
+    joined = "".join(video_ids)
+    # Pad to whole 4-character groups so no "=" padding is needed
+    joined += "A" * (-len(joined) % 4)
+    return base64.urlsafe_b64decode(joined)
+
+
+def _unpack_ids(packed, count):
+    joined = base64.urlsafe_b64encode(packed).decode("ascii")
+    return [joined[i:i + VIDEO_ID_LENGTH] for i in range(0, count * VIDEO_ID_LENGTH, VIDEO_ID_LENGTH)]
+
+
+def encode_playlist(name, video_ids, compress=None):
+    """Pack a playlist name and its video IDs into a URL-safe share token
+
+    With compress=None the body is compressed only if that makes it smaller.
+    """
+    if len(video_ids) > MAX_TRACKS:
+        raise ShareLinkError(f"Playlists can only be shared with up to {MAX_TRACKS} tracks")
+    for video_id in video_ids:
+        if len(video_id) != VIDEO_ID_LENGTH or not ALPHABET.issuperset(video_id):
+            raise ShareLinkError(f"Invalid video ID: {video_id}")
+
+    name_bytes = name.encode("utf-8")[:MAX_NAME_BYTES].decode("utf-8", "ignore").encode("utf-8")
+    body = (struct.pack(">B", len(name_bytes)) + name_bytes
+            + struct.pack(">H", len(video_ids)) + _pack_ids(video_ids))
+
+    flags = 0
+    if compress is not False:
+        compressed = zlib.compress(body, 9)
+        if compress or len(compressed) < len(body):
+            body = compressed
+            flags |= FLAG_COMPRESSED
+
+    payload = struct.pack(">BB", VERSION, flags) + body
+    payload += struct.pack(">I", zlib.crc32(payload))
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_playlist(token):
+    """Unpack a share token into (name, video_ids), raising ShareLinkError if it is invalid"""
+    if not token or len(token) > MAX_TOKEN_LENGTH:
+        raise ShareLinkError("Share link is empty or too long")
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except ValueError:
+        raise ShareLinkError("Share link is not valid base64")
+
+    if len(payload) < 2 + 4:
+        raise ShareLinkError("Share link is truncated")
+    payload, checksum = payload[:-4], struct.unpack(">I", payload[-4:])[0]
+    if zlib.crc32(payload) != checksum:
+        raise ShareLinkError("Share link is corrupted")
+
+    version, flags = struct.unpack_from(">BB", payload)
+    if version != VERSION:
+        raise ShareLinkError(f"Unsupported share link version: {version}")
+
+    body = payload[2:]
+    if flags & FLAG_COMPRESSED:
+        decompressor = zlib.decompressobj()
+        try:
+            body = decompressor.decompress(body, MAX_BODY_BYTES)
+        except zlib.error:
+            raise ShareLinkError("Share link is corrupted")
+        if decompressor.unconsumed_tail or not decompressor.eof:
+            raise ShareLinkError("Share link is too large")
+
+    if len(body) < 1:
+        raise ShareLinkError("Share link is truncated")
+    name_length = body[0]
+    if len(body) < 1 + name_length + 2:
+        raise ShareLinkError("Share link is truncated")
+    try:
+        name = body[1:1 + name_length].decode("utf-8")
+    except UnicodeDecodeError:
+        raise ShareLinkError("Share link is corrupted")
+    count = struct.unpack_from(">H", body, 1 + name_length)[0]
+    if count > MAX_TRACKS:
+        raise ShareLinkError("Share link has too many tracks")
+
+    packed = body[3 + name_length:]
+    if len(packed) != _packed_length(count):
+        raise ShareLinkError("Share link is truncated")
+    return name, _unpack_ids(packed, count)
@@ -1,15 +1,24 @@
 import streamlit as st
 import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
 import os
 import re
 import pytube
 from PIL import Image, ImageDraw, ImageFont
 import io
-import base64
-import json
 import time
+from user_store import MIN_PASSWORD_LENGTH, UserStore, hash_password
+from radio import RadioIndex
+from listening_history import ListeningHistory
+from playback_state import PlaybackStateStore
+from share_links import SHARE_PARAM, ShareLinkError, encode_playlist, decode_playlist
+from catalog_snapshot import Catalog, ensure_snapshot
+import youtube_sim
+from youtube_player import youtube_player
+from playlist_store import PlaylistStore, PlaylistError
+
+# Use the offline YouTube simulator (load tests, benchmarks) when CLASSICSAI_YOUTUBE_SIM is set
+SIMULATE_YOUTUBE = youtube_sim.enabled()
+YouTube = youtube_sim.YouTube if SIMULATE_YOUTUBE else pytube.YouTube
 
 # Page configuration
 st.set_page_config(
@@ -121,59 +130,46 @@ def create_decorative_header():
     st.markdown(header_html, unsafe_allow_html=True)
 
 # Authentication Helper Functions
-def save_config(config):
-    """Save updated config to yaml file"""
-    with open("config.yaml", 'w') as file:
-        yaml.dump(config, file, default_flow_style=False)
+@st.cache_resource
+def get_user_store():
+    """Shared, indexed view of config.yaml (one per server process)"""
+    if os.path.exists("config.yaml"):
+        return UserStore("config.yaml")
+    return None
 
 def register_user(username, email, password):
     """Register a new user and add to config.yaml"""
-    if os.path.exists("config.yaml"):
-        with open("config.yaml") as file:
-            config = yaml.load(file, Loader=SafeLoader)
-        
-        # Check if username already exists
-        if username in config["credentials"]["usernames"]:
-            return False, "Username already exists"
-        
-        # Check if email already exists
-        for user_data in config["credentials"]["usernames"].values():
-            if user_data["email"] == email:
-                return False, "Email already exists"
-        
-        # Hash the password
-        hashed_password = stauth.Hasher([password]).generate()[0]
-        
-        # Add the new user
-        config["credentials"]["usernames"][username] = {
-            "email": email,
-            "name": username,  # Use username as the name
-            "password": hashed_password
-        }
-        
-        # Add to preauthorized emails if not already there
-        if email not in config["preauthorized"]["emails"]:
-            config["preauthorized"]["emails"].append(email)
-        
-        # Save updated config
-        save_config(config)
-        return True, "Registration successful"
-    else:
+    store = get_user_store()
+    if store is None:
         return False, "Configuration file not found"
+    
+    # Cheap index lookups before paying for the bcrypt hash
+    if store.has_username(username):
+        return False, "Username already exists"
+    if store.has_email(email):
+        return False, "Email already exists"
+    
+    # Hash the password
+    hashed_password = hash_password(password)
+    
+    # Add the new user (appended to the journal, re-checked under the lock)
+    return store.add_user(username, email, username, hashed_password)  # Use username as the name
 
 # Authentication
 def get_authenticator():
-    if os.path.exists("config.yaml"):
-        with open("config.yaml") as file:
-            config = yaml.load(file, Loader=SafeLoader)
+    store = get_user_store()
+    if store is not None:
+        # The exported credentials are shared, keep sign-ups out until stauth has copied them
+        with store.lock:
+            config = store.export_config()
             
-        authenticator = stauth.Authenticate(
-            config["credentials"],
-            config["cookie"]["name"],
-            config["cookie"]["key"],
-            config["cookie"]["expiry_days"],
-            config["preauthorized"]
-        )
+            authenticator = stauth.Authenticate(
+                config["credentials"],
+                config["cookie"]["name"],
+                config["cookie"]["key"],
+                config["cookie"]["expiry_days"],
+                config["preauthorized"]
+            )
         return authenticator
     else:
         st.error("Configuration file not found. Please create a config.yaml file.")
@@ -185,78 +181,22 @@ def extract_video_id(url):
     match = re.search(pattern, url)
     return match.group(1) if match else None
 
-# Function to create embedded YouTube player with proper end detection
-def embed_youtube_video(video_id):
-    # Generate a unique key for this instance
-    player_key = f"player_{video_id}"
-    
-    # Create the YouTube player with API enabled
-    html = f"""
-    <div id="{player_key}_container" style="position: relative; padding-bottom: 56.25%; height: 0; overflow: hidden; max-width: 100%; background-color: #EAE6D9; border: 2px solid #D4AF37; border-radius: 8px;">
-        <iframe 
-            id="{player_key}"
-            style="position: absolute; top: 0; left: 0; width: 100%; height: 100%;" 
-            src="https://www.youtube.com/embed/{video_id}?enablejsapi=1&autoplay=1&rel=0" 
-            title="YouTube video player" 
-            frameborder="0" 
-            allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture" 
-            allowfullscreen>
-        </iframe>
-    </div>
-
-    <script>
-        // Only load the YouTube API once
-        if (!window.YT) {{
-            var tag = document.createElement('script');
-            tag.src = "https://www.youtube.com/iframe_api";
-            var firstScriptTag = document.getElementsByTagName('script')[0];
-            firstScriptTag.parentNode.insertBefore(tag, firstScriptTag);
-        }}
+# User playlists: stable track IDs with per-track versions (migrates playlists.json once)
+@st.cache_resource
+def get_playlist_store():
+    return PlaylistStore("playlists.log", legacy_path="playlists.json")
 
-        // Initialize player once API is ready
-        function initPlayer() {{
-            if (window.YT && window.YT.Player) {{
-                new YT.Player('{player_key}', {{
-                    events: {{
-                        'onStateChange': function(event) {{
-                            // When video ends (state = 0)
-                            if (event.data === 0) {{
-                                // Set a session flag
-                                localStorage.setItem('video_ended', '{video_id}');
-                                
-                                // Get the next button and click it programmatically
-                                const buttons = Array.from(document.querySelectorAll('button'));
-                                const nextButton = buttons.find(button => button.innerText.includes('⏭ Next'));
-                                if (nextButton) {{
-                                    nextButton.click();
-                                }}
-                            }}
-                        }}
-                    }}
-                }});
-            }} else {{
-                // If API isn't ready yet, wait and try again
-                setTimeout(initPlayer, 100);
-            }}
-        }}
-
-        // Start initialization
-        initPlayer();
-    </script>
-    """
-    
-    return html
-
-# Function to load and save playlists
 def load_playlists():
-    if os.path.exists("playlists.json"):
-        with open("playlists.json", "r") as f:
-            return json.load(f)
-    return {}
+    return get_playlist_store().playlists()
 
-def save_playlists(playlists):
-    with open("playlists.json", "w") as f:
-        json.dump(playlists, f)
+def edit_playlist(edit, *args):
+    """Apply a playlist edit, showing a warning if another session got there first"""
+    try:
+        edit(*args)
+    except PlaylistError as e:
+        st.warning(f"{e}. The playlist has been refreshed.")
+        return False
+    return True
 
 # Featured playlists
 def get_featured_playlists():
@@ -298,11 +238,240 @@ def get_featured_playlists():
         ]
     }
 
+# Catalog snapshot, memory-mapped and shared by all server processes.
+# Set CLASSICSAI_CATALOG to serve a snapshot built with catalog_snapshot.py instead
+CATALOG_PATH = os.environ.get("CLASSICSAI_CATALOG", "catalog.bin")
+
+@st.cache_resource
+def get_catalog():
+    if "CLASSICSAI_CATALOG" not in os.environ:
+        # Rebuilt whenever get_featured_playlists() changes
+        ensure_snapshot(get_featured_playlists(), CATALOG_PATH)
+    return Catalog(CATALOG_PATH)
+
+# Radio mode: similarity index over the catalog and user playlists.
+# Catalog tracks are referenced by snapshot record number, so a new snapshot gets a new index
+@st.cache_resource(max_entries=1)
+def load_radio_index(signature, _snapshot):
+    # Maps the neighbour arrays saved next to the snapshot (computed here if missing)
+    return RadioIndex.open(_snapshot, CATALOG_PATH)
+
+def get_radio_index():
+    snapshot = get_catalog().snapshot
+    return load_radio_index(snapshot.signature, snapshot)
+
+def queue_radio_tracks(length=50):
+    """Extend the current queue with similar tracks when it is about to run out"""
+    if not st.session_state.radio_enabled or not st.session_state.current_playlist:
+        return
+    if st.session_state.current_track_index < len(st.session_state.current_playlist) - 1:
+        return
+    
+    # Loaded on first use, so sessions that never use radio mode don't pay for it
+    radio_index = get_radio_index()
+    # Include the user playlists (already indexed tracks are skipped)
+    for tracks in st.session_state.user_playlists.values():
+        radio_index.add_tracks(tracks)
+    
+    current_track = st.session_state.current_playlist[st.session_state.current_track_index]
+    # Avoid repeating what was just played
+    recent = [extract_video_id(track["url"]) for track in st.session_state.current_playlist[-length:]]
+    radio_tracks = radio_index.radio_queue(current_track, length=length, exclude=recent)
+    if radio_tracks:
+        # Copy so featured and user playlists are never modified
+        st.session_state.current_playlist = st.session_state.current_playlist + radio_tracks
+
+# Playlist sharing
+def share_playlist_token(playlist_name, tracks):
+    return encode_playlist(playlist_name, [extract_video_id(track["url"]) for track in tracks])
+
+def import_shared_playlist(shared_name, video_ids):
+    """Add a decoded share link to the user's playlists, returns the name used"""
+    store = get_playlist_store()
+    
+    # Titles come from tracks we already know about, no metadata requests
+    catalog = get_catalog().snapshot
+    library_titles = {extract_video_id(track["url"]): track["title"]
+                      for tracks in store.playlists().values() for track in tracks}
+    tracks = []
+    for video_id in video_ids:
+        known_track = catalog.find(video_id)
+        title = known_track["title"] if known_track else library_titles.get(video_id)
+        tracks.append({
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "title": title or f"Shared track {video_id}"
+        })
+    
+    # Create the playlist and its tracks in a single write
+    playlist_name = shared_name or "Shared Playlist"
+    suffix = 2
+    while True:
+        try:
+            store.add_tracks(playlist_name, tracks, create=True)
+            break
+        except PlaylistError:
+            playlist_name = f"{shared_name or 'Shared Playlist'} ({suffix})"
+            suffix += 1
+    return playlist_name
+
+# Listening history
+@st.cache_resource
+def get_listening_history():
+    return ListeningHistory()
+
+def record_play_event(event):
+    """Log a play event for the current track"""
+    if not st.session_state.current_video_id:
+        return
+    # Once the player has reported the end, moving on is not a skip or a stop
+    if st.session_state.get("track_ended"):
+        return
+    position = None
+    if st.session_state.get("video_start_time"):
+        position = time.time() - st.session_state.video_start_time
+    duration = st.session_state.get("video_duration")
+    get_listening_history().record(
+        event,
+        st.session_state.get("username"),
+        st.session_state.current_video_id,
+        title=st.session_state.current_video_title,
+        position=position,
+        duration=duration
+    )
+    if event == "ended":
+        st.session_state.track_ended = True
+
+def play_track(playlist, index, previous_event="skip", queue_handle=None):
+    """Start playing playlist[index], logging how the previous track finished"""
+    if previous_event:
+        record_play_event(previous_event)
+    track = playlist[index]
+    if queue_handle is not None:
+        st.session_state.current_queue_handle = queue_handle
+    st.session_state.current_playlist = playlist
+    st.session_state.current_track_index = index
+    st.session_state.current_video_id = extract_video_id(track["url"])
+    st.session_state.current_video_title = track["title"]
+    st.session_state.video_start_time = time.time()
+    st.session_state.video_duration = None
+    st.session_state.resume_position = 0
+    st.session_state.track_ended = False
+    record_play_event("start")
+
+def handle_track_end(report):
+    """Log a track the player reports as played to the end and, with autoplay, move on
+
+    Returns True if playback changed and the script should rerun.
+    """
+    if (not report or st.session_state.track_ended
+            or report["play_id"] != st.session_state.get("video_start_time")):
+        # Already logged, or from a play that has since been replaced
+        return False
+    record_play_event("ended")
+    if not st.session_state.autoplay_enabled:
+        return False
+    queue_radio_tracks()
+    if (st.session_state.current_playlist and 
+        st.session_state.current_track_index < len(st.session_state.current_playlist) - 1):
+        play_track(st.session_state.current_playlist,
+                   st.session_state.current_track_index + 1,
+                   previous_event=None)
+    else:
+        # End of the queue
+        st.session_state.resume_position = 0
+        st.session_state.current_video_id = None
+        st.session_state.current_video_title = None
+        st.session_state.video_start_time = None
+        st.session_state.video_duration = None
+    return True
+
+# Playback state snapshots (resume after reconnect or redeploy)
+@st.cache_resource
+def get_playback_state_store():
+    return PlaybackStateStore()
+
+def compact_queue(playlist):
+    """[video_id, title] pairs for a queue, cached until the queue changes"""
+    if st.session_state.get("compact_queue_source") is not playlist:
+        st.session_state.compact_queue = [[extract_video_id(track["url"]), track["title"]] for track in playlist]
+        st.session_state.compact_queue_source = playlist
+    return st.session_state.compact_queue
+
+def save_playback_state(username):
+    position = 0
+    if st.session_state.current_video_id and st.session_state.get("video_start_time"):
+        position = int(time.time() - st.session_state.video_start_time)
+    snapshot = {
+        "queue": {
+            "handle": st.session_state.current_queue_handle,
+            "tracks": compact_queue(st.session_state.current_playlist)
+        },
+        "index": st.session_state.current_track_index,
+        "video_id": st.session_state.current_video_id,
+        "position": position,
+        "duration": st.session_state.get("video_duration"),
+        "autoplay": st.session_state.autoplay_enabled,
+        "radio": st.session_state.radio_enabled,
+        "auto_refresh": st.session_state.auto_refresh
+    }
+    # Most reruns change nothing, only hand real changes to the store
+    if st.session_state.get("saved_playback_state") != snapshot:
+        get_playback_state_store().save(username, snapshot)
+        st.session_state.saved_playback_state = snapshot
+
+def reset_playback_state():
+    """Back to a fresh session's playback: nothing playing, empty queue, default settings"""
+    st.session_state.current_playlist = []
+    st.session_state.current_track_index = 0
+    st.session_state.current_video_id = None
+    st.session_state.current_video_title = None
+    st.session_state.video_start_time = None
+    st.session_state.video_duration = None
+    st.session_state.resume_position = 0
+    st.session_state.current_queue_handle = None
+    st.session_state.track_ended = False
+    st.session_state.autoplay_enabled = True
+    st.session_state.radio_enabled = False
+    st.session_state.auto_refresh = False
+    st.session_state.pop("saved_playback_state", None)
+
+def restore_playback_state(username):
+    # Nothing carries over from whoever was logged in before in this session
+    reset_playback_state()
+    snapshot = get_playback_state_store().load(username)
+    if not snapshot:
+        return
+    st.session_state.autoplay_enabled = snapshot["autoplay"]
+    st.session_state.radio_enabled = snapshot["radio"]
+    st.session_state.auto_refresh = snapshot["auto_refresh"]
+    tracks = [{"url": f"https://www.youtube.com/watch?v={video_id}", "title": title}
+              for video_id, title in snapshot["queue"]["tracks"]]
+    if not 0 <= snapshot["index"] < len(tracks):
+        # Queue and position don't line up, start with an empty queue
+        return
+    st.session_state.current_queue_handle = snapshot["queue"]["handle"]
+    st.session_state.current_playlist = tracks
+    st.session_state.current_track_index = snapshot["index"]
+    if snapshot["video_id"]:
+        st.session_state.current_video_id = snapshot["video_id"]
+        st.session_state.current_video_title = tracks[snapshot["index"]]["title"]
+        # Saved duration avoids another metadata lookup
+        st.session_state.video_duration = snapshot["duration"]
+        st.session_state.video_start_time = time.time() - snapshot["position"]
+        st.session_state.resume_position = snapshot["position"]
+
+def show_top_tracks(top_tracks):
+    if not top_tracks:
+        st.info("Nothing played yet")
+    for i, entry in enumerate(top_tracks):
+        st.write(f"{i+1}. {entry['title']} — {entry['plays']} plays, "
+                 f"{entry['completion_rate']:.0%} completed")
+
 # Main application
 def main():
-    # Initialize session state for playlists if not exists
-    if "user_playlists" not in st.session_state:
-        st.session_state.user_playlists = load_playlists()
+    # Reload playlists on every run so edits from other sessions show up
+    # (the store only reads log lines it hasn't seen yet)
+    st.session_state.user_playlists = load_playlists()
     
     if "current_video_id" not in st.session_state:
         st.session_state.current_video_id = None
@@ -320,6 +489,20 @@ def main():
     if "autoplay_enabled" not in st.session_state:
         st.session_state.autoplay_enabled = True
     
+    if "current_queue_handle" not in st.session_state:
+        st.session_state.current_queue_handle = None
+    
+    if "resume_position" not in st.session_state:
+        st.session_state.resume_position = 0
+    
+    # Set once the player reports the current track played to the end
+    if "track_ended" not in st.session_state:
+        st.session_state.track_ended = False
+    
+    # Add a session state for radio mode
+    if "radio_enabled" not in st.session_state:
+        st.session_state.radio_enabled = False
+    
     # Add a session state for auto-refresh
     if "auto_refresh" not in st.session_state:
         st.session_state.auto_refresh = False
@@ -363,8 +546,8 @@ def main():
                         st.error("All fields are required")
                     elif not re.match(r"[^@]+@[^@]+\.[^@]+", reg_email):
                         st.error("Please enter a valid email address")
-                    elif len(reg_password) < 6:
-                        st.error("Password must be at least 6 characters long")
+                    elif len(reg_password) < MIN_PASSWORD_LENGTH:
+                        st.error(f"Password must be at least {MIN_PASSWORD_LENGTH} characters long")
                     elif reg_password != reg_password2:
                         st.error("Passwords do not match")
                     else:
@@ -407,8 +590,8 @@ def main():
                         st.error("All fields are required")
                     elif not re.match(r"[^@]+@[^@]+\.[^@]+", reg_email):
                         st.error("Please enter a valid email address")
-                    elif len(reg_password) < 6:
-                        st.error("Password must be at least 6 characters long")
+                    elif len(reg_password) < MIN_PASSWORD_LENGTH:
+                        st.error(f"Password must be at least {MIN_PASSWORD_LENGTH} characters long")
                     elif reg_password != reg_password2:
                         st.error("Passwords do not match")
                     else:
@@ -422,6 +605,11 @@ def main():
                             st.error(message)
         
     elif authentication_status:
+        # Pick up where this user left off (once per session and user)
+        if st.session_state.get("restored_playback_for") != username:
+            restore_playback_state(username)
+            st.session_state.restored_playback_for = username
+        
         # Sidebar
         with st.sidebar:
             st.subheader(f"Welcome, {name}")
@@ -430,6 +618,9 @@ def main():
             # Add autoplay toggle
             st.session_state.autoplay_enabled = st.checkbox("Enable Autoplay", value=st.session_state.autoplay_enabled)
             
+            # Keep playing similar tracks once the queue runs out
+            st.session_state.radio_enabled = st.checkbox("Radio mode (play similar tracks)", value=st.session_state.radio_enabled)
+            
             # Add auto-refresh toggle for autoplay functionality
             if st.session_state.autoplay_enabled:
                 st.session_state.auto_refresh = st.checkbox("Auto-refresh (helps with autoplay)", value=st.session_state.auto_refresh)
@@ -456,7 +647,7 @@ def main():
                 # Try to get video duration using pytube
                 if "video_duration" not in st.session_state or st.session_state.video_duration is None:
                     try:
-                        yt = pytube.YouTube(f"https://www.youtube.com/watch?v={st.session_state.current_video_id}")
+                        yt = YouTube(f"https://www.youtube.com/watch?v={st.session_state.current_video_id}")
                         st.session_state.video_duration = yt.length  # Duration in seconds
                     except Exception as e:
                         st.session_state.video_duration = 300  # Default to 5 minutes if we can't get the duration
@@ -469,32 +660,27 @@ def main():
                     
                     # If the video has ended and autoplay is enabled, play the next track
                     if progress >= 0.99 and st.session_state.autoplay_enabled:
+                        queue_radio_tracks()
                         if (st.session_state.current_playlist and 
                             st.session_state.current_track_index < len(st.session_state.current_playlist) - 1):
-                            st.session_state.current_track_index += 1
-                            track = st.session_state.current_playlist[st.session_state.current_track_index]
-                            video_id = extract_video_id(track["url"])
-                            st.session_state.current_video_id = video_id
-                            st.session_state.current_video_title = track["title"]
-                            st.session_state.video_start_time = time.time()
-                            st.session_state.video_duration = None
+                            # Only the player can tell a track was played to the end
+                            play_track(st.session_state.current_playlist,
+                                       st.session_state.current_track_index + 1,
+                                       previous_event="end")
                             st.rerun()
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     if st.button("⏮ Previous"):
                         if st.session_state.current_playlist and st.session_state.current_track_index > 0:
-                            st.session_state.current_track_index -= 1
-                            track = st.session_state.current_playlist[st.session_state.current_track_index]
-                            video_id = extract_video_id(track["url"])
-                            st.session_state.current_video_id = video_id
-                            st.session_state.current_video_title = track["title"]
-                            st.session_state.video_start_time = time.time()
-                            st.session_state.video_duration = None
+                            play_track(st.session_state.current_playlist,
+                                       st.session_state.current_track_index - 1)
                             st.rerun()
                 
                 with col2:
                     if st.button("⏹ Stop"):
+                        record_play_event("end")
+                        st.session_state.resume_position = 0
                         st.session_state.current_video_id = None
                         st.session_state.current_video_title = None
                         st.session_state.video_start_time = None
@@ -503,16 +689,13 @@ def main():
                 
                 with col3:
                     if st.button("⏭ Next"):
+                        queue_radio_tracks()
                         if (st.session_state.current_playlist and 
                             st.session_state.current_track_index < len(st.session_state.current_playlist) - 1):
-                            st.session_state.current_track_index += 1
-                            track = st.session_state.current_playlist[st.session_state.current_track_index]
-                            video_id = extract_video_id(track["url"])
-                            st.session_state.current_video_id = video_id
-                            st.session_state.current_video_title = track["title"]
-                            st.session_state.video_start_time = time.time()
-                            st.session_state.video_duration = None
+                            play_track(st.session_state.current_playlist,
+                                       st.session_state.current_track_index + 1)
                             st.rerun()
+                
             else:
                 st.write("No track playing")
         
@@ -521,73 +704,83 @@ def main():
         
         # Video player
         if st.session_state.current_video_id:
-            if st.session_state.autoplay_enabled:
-                st.markdown(embed_youtube_video(st.session_state.current_video_id), unsafe_allow_html=True)
-            else:
-                # Use regular embed without autoplay/end detection if autoplay is disabled
-                st.markdown(f"""
-                <div style="position: relative; padding-bottom: 56.25%; height: 0; overflow: hidden; max-width: 100%; background-color: #EAE6D9; border: 2px solid #D4AF37; border-radius: 8px;">
-                    <iframe 
-                        style="position: absolute; top: 0; left: 0; width: 100%; height: 100%;" 
-                        src="https://www.youtube.com/embed/{st.session_state.current_video_id}" 
-                        title="YouTube video player" 
-                        frameborder="0" 
-                        allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture" 
-                        allowfullscreen>
-                    </iframe>
-                </div>
-                """, unsafe_allow_html=True)
+            simulated = None
+            if SIMULATE_YOUTUBE:
+                simulated = youtube_sim.simulated_play(st.session_state.current_video_id,
+                                                       start=st.session_state.resume_position)
+            # Reports tracks that play to the end, with or without autoplay
+            track_end = youtube_player(st.session_state.current_video_id,
+                                       st.session_state.video_start_time,
+                                       start=st.session_state.resume_position,
+                                       autoplay=st.session_state.autoplay_enabled,
+                                       simulated=simulated)
+            if handle_track_end(track_end):
+                st.rerun()
         
         # Tabs for different sections - removed Channel Browser and Search tabs
-        tab1, tab2 = st.tabs(["Featured Playlists", "My Playlists"])
+        tab1, tab2, tab3 = st.tabs(["Featured Playlists", "My Playlists", "Listening Stats"])
         
         # Tab 1: Featured Playlists
         with tab1:
             st.header("Featured Playlists")
             
-            featured_playlists = get_featured_playlists()
+            # Only names are read on every run; a playlist's tracks are decoded
+            # from the snapshot when it is played or its track list is shown
+            snapshot = get_catalog().snapshot
             
-            for playlist_name, tracks in featured_playlists.items():
+            for playlist_index, playlist_name in enumerate(snapshot.playlist_names()):
                 with st.expander(playlist_name, expanded=False):
                     if st.button(f"Play All: {playlist_name}", key=f"play_all_{playlist_name}"):
-                        st.session_state.current_playlist = tracks
-                        st.session_state.current_track_index = 0
-                        first_track = tracks[0]
-                        video_id = extract_video_id(first_track["url"])
-                        st.session_state.current_video_id = video_id
-                        st.session_state.current_video_title = first_track["title"]
+                        play_track(snapshot.playlist_tracks(playlist_index), 0,
+                                   queue_handle=f"featured:{playlist_name}")
                         st.rerun()
                     
+                    if not st.checkbox("Show tracks", key=f"show_tracks_{playlist_name}"):
+                        continue
+                    tracks = snapshot.playlist_tracks(playlist_index)
                     for i, track in enumerate(tracks):
                         col1, col2 = st.columns([3, 1])
                         with col1:
                             st.write(f"{i+1}. {track['title']}")
                         with col2:
                             if st.button("Play", key=f"play_{playlist_name}_{i}"):
-                                video_id = extract_video_id(track["url"])
-                                st.session_state.current_video_id = video_id
-                                st.session_state.current_video_title = track["title"]
-                                st.session_state.current_playlist = tracks
-                                st.session_state.current_track_index = i
+                                play_track(tracks, i, queue_handle=f"featured:{playlist_name}")
                                 st.rerun()
         
         # Tab 2: My Playlists
         with tab2:
             st.header("My Playlists")
             
+            # Import a playlist shared through a link
+            shared_token = st.query_params.get(SHARE_PARAM)
+            if shared_token:
+                with st.expander("Shared Playlist", expanded=True):
+                    try:
+                        shared_name, shared_ids = decode_playlist(shared_token)
+                    except ShareLinkError as e:
+                        st.error(f"Could not read shared playlist: {e}")
+                    else:
+                        st.write(f"**{shared_name or 'Shared Playlist'}** ({len(shared_ids)} tracks)")
+                        if st.button("Import Shared Playlist"):
+                            imported_name = import_shared_playlist(shared_name, shared_ids)
+                            del st.query_params[SHARE_PARAM]
+                            st.success(f"Playlist '{imported_name}' imported!")
+                            st.rerun()
+            
             # Create new playlist
             with st.expander("Create New Playlist", expanded=False):
                 playlist_name = st.text_input("Playlist Name", key="new_playlist_name")
                 if st.button("Create Playlist"):
-                    if playlist_name and playlist_name not in st.session_state.user_playlists:
-                        st.session_state.user_playlists[playlist_name] = []
-                        save_playlists(st.session_state.user_playlists)
-                        st.success(f"Playlist '{playlist_name}' created!")
-                        st.rerun()
-                    elif not playlist_name:
+                    if not playlist_name:
                         st.error("Please enter a playlist name")
                     else:
-                        st.error(f"Playlist '{playlist_name}' already exists")
+                        try:
+                            get_playlist_store().create(playlist_name)
+                        except PlaylistError as e:
+                            st.error(str(e))
+                        else:
+                            st.success(f"Playlist '{playlist_name}' created!")
+                            st.rerun()
             
             # Add song to playlist
             with st.expander("Add Song to Playlist", expanded=False):
@@ -602,13 +795,9 @@ def main():
                         if song_url and song_title:
                             video_id = extract_video_id(song_url)
                             if video_id:
-                                st.session_state.user_playlists[selected_playlist].append({
-                                    "url": song_url,
-                                    "title": song_title
-                                })
-                                save_playlists(st.session_state.user_playlists)
-                                st.success(f"Song added to '{selected_playlist}'!")
-                                st.rerun()
+                                if edit_playlist(get_playlist_store().add_track, selected_playlist, song_url, song_title):
+                                    st.success(f"Song added to '{selected_playlist}'!")
+                                    st.rerun()
                             else:
                                 st.error("Invalid YouTube URL")
                         else:
@@ -616,51 +805,85 @@ def main():
                 else:
                     st.info("Create a playlist first")
             
+            # Edits carry the track versions this user was shown on the previous run,
+            # so a track changed by another session in between is reported as a conflict
+            shown_versions = st.session_state.get("shown_track_versions", {})
+            st.session_state.shown_track_versions = {}
+            
             # Display user playlists
             if st.session_state.user_playlists:
                 for playlist_name, tracks in st.session_state.user_playlists.items():
                     with st.expander(playlist_name, expanded=False):
-                        col1, col2 = st.columns([3, 1])
+                        col1, col2, col3 = st.columns([3, 1, 1])
                         with col1:
                             st.subheader(playlist_name)
                         with col2:
+                            share_clicked = st.button("Share", key=f"share_{playlist_name}", disabled=not tracks)
+                        with col3:
                             if st.button("Delete Playlist", key=f"delete_{playlist_name}"):
-                                del st.session_state.user_playlists[playlist_name]
-                                save_playlists(st.session_state.user_playlists)
-                                st.success(f"Playlist '{playlist_name}' deleted!")
-                                st.rerun()
+                                if edit_playlist(get_playlist_store().delete, playlist_name):
+                                    st.success(f"Playlist '{playlist_name}' deleted!")
+                                    st.rerun()
+                        
+                        if share_clicked:
+                            try:
+                                token = share_playlist_token(playlist_name, tracks)
+                            except ShareLinkError as e:
+                                st.error(str(e))
+                            else:
+                                st.caption("Append this to the app URL to share the playlist:")
+                                st.code(f"?{SHARE_PARAM}={token}")
                         
                         if tracks:
                             if st.button(f"Play All: {playlist_name}", key=f"play_all_user_{playlist_name}"):
-                                st.session_state.current_playlist = tracks
-                                st.session_state.current_track_index = 0
-                                first_track = tracks[0]
-                                video_id = extract_video_id(first_track["url"])
-                                st.session_state.current_video_id = video_id
-                                st.session_state.current_video_title = first_track["title"]
+                                play_track(tracks, 0, queue_handle=f"user:{playlist_name}")
                                 st.rerun()
                             
+                            # Edits address tracks by their stable ID and the version shown here
+                            store = get_playlist_store()
                             for i, track in enumerate(tracks):
-                                col1, col2, col3 = st.columns([3, 1, 1])
+                                shown_version = shown_versions.get(track["id"], track["version"])
+                                st.session_state.shown_track_versions[track["id"]] = track["version"]
+                                col1, col2, col3, col4, col5 = st.columns([3, 1, 1, 1, 1])
                                 with col1:
                                     st.write(f"{i+1}. {track['title']}")
                                 with col2:
-                                    if st.button("Play", key=f"play_user_{playlist_name}_{i}"):
-                                        video_id = extract_video_id(track["url"])
-                                        st.session_state.current_video_id = video_id
-                                        st.session_state.current_video_title = track["title"]
-                                        st.session_state.current_playlist = tracks
-                                        st.session_state.current_track_index = i
+                                    if st.button("Play", key=f"play_user_{playlist_name}_{track['id']}"):
+                                        play_track(tracks, i, queue_handle=f"user:{playlist_name}")
                                         st.rerun()
                                 with col3:
-                                    if st.button("Remove", key=f"remove_{playlist_name}_{i}"):
-                                        st.session_state.user_playlists[playlist_name].pop(i)
-                                        save_playlists(st.session_state.user_playlists)
-                                        st.rerun()
+                                    if st.button("▲", key=f"up_{playlist_name}_{track['id']}", disabled=i == 0):
+                                        after_id = tracks[i - 2]["id"] if i >= 2 else None
+                                        if edit_playlist(store.move_track, playlist_name, track["id"], shown_version, after_id):
+                                            st.rerun()
+                                with col4:
+                                    if st.button("▼", key=f"down_{playlist_name}_{track['id']}", disabled=i == len(tracks) - 1):
+                                        if edit_playlist(store.move_track, playlist_name, track["id"], shown_version, tracks[i + 1]["id"]):
+                                            st.rerun()
+                                with col5:
+                                    if st.button("Remove", key=f"remove_{playlist_name}_{track['id']}"):
+                                        if edit_playlist(store.remove_track, playlist_name, track["id"], shown_version):
+                                            st.rerun()
                         else:
                             st.info("This playlist is empty")
             else:
                 st.info("You don't have any playlists yet")
+        
+        # Tab 3: Listening Stats (served from precomputed rollups)
+        with tab3:
+            st.header("Listening Stats")
+            history = get_listening_history()
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("Your Top Tracks")
+                show_top_tracks(history.top_tracks(10, username=username))
+            with col2:
+                st.subheader("Most Played Overall")
+                show_top_tracks(history.top_tracks(10))
+        
+        # Snapshot playback state (writes are coalesced by the store)
+        save_playback_state(username)
 
 if __name__ == "__main__":
     main() 
@@ -0,0 +1,117 @@
+import json
+import random
+
+import pytest
+
+from playlist_store import PlaylistConflict, PlaylistError, PlaylistStore, key_between
+
+
+def track(i):
+    return {"url": f"https://www.youtube.com/watch?v={i:011d}", "title": f"Track {i}"}
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "playlists.log")
+
+
+def titles(store, name):
+    return [entry["title"] for entry in store.tracks(name)]
+
+
+def test_key_between_sorts_strictly_between():
+    rng = random.Random(0)
+    keys = [key_between(None, None)]
+    for _ in range(5000):
+        i = rng.randrange(len(keys) + 1)
+        lower = keys[i - 1] if i > 0 else None
+        upper = keys[i] if i < len(keys) else None
+        key = key_between(lower, upper)
+        assert lower is None or lower < key
+        assert upper is None or key < upper
+        keys.insert(i, key)
+    assert keys == sorted(keys)
+
+
+def test_key_between_rejects_bad_bounds():
+    with pytest.raises(ValueError):
+        key_between("a1", "a0")
+    with pytest.raises(ValueError):
+        key_between("a1", "a1")
+
+
+def test_appended_keys_grow_logarithmically():
+    key = None
+    for _ in range(10000):
+        key = key_between(key, None)
+    assert len(key) <= 4
+    key = None
+    for _ in range(10000):
+        key = key_between(None, key)
+    assert len(key) <= 4
+
+
+def test_add_move_remove(log_path):
+    store = PlaylistStore(log_path, legacy_path=None)
+    store.create("Mix")
+    store.add_tracks("Mix", [track(i) for i in range(4)])
+    first, second, third, fourth = store.tracks("Mix")
+
+    store.move_track("Mix", fourth["id"], fourth["version"])
+    assert titles(store, "Mix") == ["Track 3", "Track 0", "Track 1", "Track 2"]
+    store.move_track("Mix", first["id"], first["version"], after_track_id=third["id"])
+    assert titles(store, "Mix") == ["Track 3", "Track 1", "Track 2", "Track 0"]
+    store.remove_track("Mix", second["id"], second["version"])
+    assert titles(store, "Mix") == ["Track 3", "Track 2", "Track 0"]
+
+    reopened = PlaylistStore(log_path, legacy_path=None)
+    assert titles(reopened, "Mix") == ["Track 3", "Track 2", "Track 0"]
+
+
+def test_stale_version_is_a_conflict(log_path):
+    mine = PlaylistStore(log_path, legacy_path=None)
+    theirs = PlaylistStore(log_path, legacy_path=None)
+    mine.create("Mix")
+    mine.add_tracks("Mix", [track(i) for i in range(3)])
+    shown = mine.tracks("Mix")
+
+    # Another session moves the first track
+    theirs.move_track("Mix", shown[0]["id"], shown[0]["version"], after_track_id=shown[2]["id"])
+
+    with pytest.raises(PlaylistConflict):
+        mine.remove_track("Mix", shown[0]["id"], shown[0]["version"])
+    with pytest.raises(PlaylistConflict):
+        mine.move_track("Mix", shown[0]["id"], shown[0]["version"])
+    # Edits to other tracks still go through
+    mine.remove_track("Mix", shown[1]["id"], shown[1]["version"])
+    assert titles(theirs, "Mix") == ["Track 2", "Track 0"]
+
+
+def test_removed_track_and_deleted_playlist_are_conflicts(log_path):
+    mine = PlaylistStore(log_path, legacy_path=None)
+    theirs = PlaylistStore(log_path, legacy_path=None)
+    mine.create("Mix")
+    [added] = mine.add_tracks("Mix", [track(1)])
+
+    theirs.remove_track("Mix", added["id"], added["version"])
+    with pytest.raises(PlaylistConflict):
+        mine.move_track("Mix", added["id"], added["version"])
+
+    theirs.delete("Mix")
+    with pytest.raises(PlaylistConflict):
+        mine.add_track("Mix", track(2)["url"], track(2)["title"])
+
+
+def test_add_tracks_can_create_in_one_write(log_path):
+    store = PlaylistStore(log_path, legacy_path=None)
+    store.add_tracks("Shared", [track(1), track(2)], create=True)
+    assert titles(store, "Shared") == ["Track 1", "Track 2"]
+    with pytest.raises(PlaylistError):
+        store.add_tracks("Shared", [track(3)], create=True)
+
+
+def test_migrates_legacy_json(tmp_path, log_path):
+    legacy_path = tmp_path / "playlists.json"
+    legacy_path.write_text(json.dumps({"Old": [track(1), track(2)]}))
+    store = PlaylistStore(log_path, legacy_path=str(legacy_path))
+    assert titles(store, "Old") == ["Track 1", "Track 2"]
@@ -0,0 +1,92 @@
+import base64
+import random
+import struct
+import zlib
+
+import pytest
+
+from share_links import (MAX_TOKEN_LENGTH, MAX_TRACKS, ShareLinkError, decode_playlist,
+                         encode_playlist)
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def random_ids(count, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(ALPHABET) for _ in range(11)) for _ in range(count)]
+
+
+def payload_token(payload):
+    payload += struct.pack(">I", zlib.crc32(payload))
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("compress", [None, True, False])
+def test_round_trip(compress):
+    video_ids = random_ids(200)
+    token = encode_playlist("Best of Beethoven", video_ids, compress=compress)
+    assert decode_playlist(token) == ("Best of Beethoven", video_ids)
+
+
+def test_200_tracks_fit_in_a_url():
+    token = encode_playlist("Mix", random_ids(200))
+    assert len(token) < 2400
+    assert set(token) <= set(ALPHABET)
+
+
+def test_round_trip_edge_cases():
+    assert decode_playlist(encode_playlist("", [])) == ("", [])
+    ids = random_ids(3)
+    assert decode_playlist(encode_playlist("Ünïcødé ♪", ids)) == ("Ünïcødé ♪", ids)
+    # Names are cut to 255 bytes without splitting a character
+    name, _ = decode_playlist(encode_playlist("♪" * 200, ids))
+    assert name == "♪" * 85
+
+
+def test_rejects_invalid_input_when_encoding():
+    with pytest.raises(ShareLinkError):
+        encode_playlist("Too long", random_ids(MAX_TRACKS + 1))
+    with pytest.raises(ShareLinkError):
+        encode_playlist("Bad ID", ["short"])
+    with pytest.raises(ShareLinkError):
+        encode_playlist("Bad ID", ["invalid*id!"])
+
+
+@pytest.mark.parametrize("cut", [1, 4, 10, 100])
+def test_rejects_truncated_tokens(cut):
+    token = encode_playlist("Mix", random_ids(200), compress=False)
+    with pytest.raises(ShareLinkError):
+        decode_playlist(token[:-cut])
+
+
+def test_rejects_corrupted_tokens():
+    token = encode_playlist("Mix", random_ids(50))
+    flipped = token[:20] + ("A" if token[20] != "A" else "B") + token[21:]
+    with pytest.raises(ShareLinkError):
+        decode_playlist(flipped)
+
+
+@pytest.mark.parametrize("token", ["", "!!!!", "A", "AAAAAAAA", "A" * (MAX_TOKEN_LENGTH + 1)])
+def test_rejects_garbage(token):
+    with pytest.raises(ShareLinkError):
+        decode_playlist(token)
+
+
+def test_rejects_unknown_version():
+    with pytest.raises(ShareLinkError, match="version"):
+        decode_playlist(payload_token(b"\x09\x00" + b"\x00\x00\x00"))
+
+
+def test_rejects_track_count_over_limit():
+    body = b"\x00" + struct.pack(">H", MAX_TRACKS + 1)
+    with pytest.raises(ShareLinkError):
+        decode_playlist(payload_token(b"\x01\x00" + body))
+
+
+def test_rejects_decompression_bombs():
+    # Valid checksum, but inflates far beyond any real playlist
+    body = zlib.compress(b"\x00" * 1_000_000, 9)
+    token = payload_token(b"\x01\x01" + body)
+    assert len(token) <= MAX_TOKEN_LENGTH
+    with pytest.raises(ShareLinkError):
+        decode_playlist(token)
@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import threading
+import yaml
+
+# libyaml bindings parse and write large configs many times faster
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single process only
+    fcntl = None
+
+
+# Shortest password accepted by registration and provisioning
+MIN_PASSWORD_LENGTH = 6
+
+# Start of the journal line a fold leaves behind (see UserStore._compact)
+FOLD_MARKER = b'{"compacted": '
+# Bytes read at a time while looking for the last fold marker
+FOLD_SCAN_BLOCK = 64 * 1024
+
+
+def hash_password(password):
+    """bcrypt-hash a password the same way stauth.Hasher does (safe to run in a process pool)"""
+    import streamlit_authenticator as stauth
+    return stauth.Hasher([password]).generate()[0]
+
+
+# Indexed user store backed by config.yaml plus an append-only journal.
+#
+# config.yaml stays the source of truth that stauth.Authenticate understands.
+# New accounts are appended to "<config>.journal" (one JSON line each) instead
+# of rewriting the whole YAML file, so a sign-up costs one small write however
+# many accounts exist. Folding the journal back into config.yaml is a separate
+# step (`python user_store.py`), never part of a sign-up. The journal is kept
+# after a fold, with a marker naming the config.yaml it produced, so running
+# processes carry on reading the journal instead of re-parsing config.yaml.
+class UserStore:
+    def __init__(self, config_path="config.yaml", journal_path=None):
+        self.config_path = config_path
+        self.journal_path = journal_path or f"{config_path}.journal"
+        # Held while stauth.Authenticate copies the exported usernames
+        self.lock = threading.RLock()
+        self._load()
+
+    # Loading
+
+    def _config_signature(self):
+        stat = os.stat(self.config_path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _load(self):
+        """Read config.yaml and replay the journal into the in-memory indexes"""
+        with open(self.config_path) as file:
+            config = yaml.load(file, Loader=SafeLoader)
+            # Signature of the file we parsed, even if a fold has replaced it since
+            stat = os.fstat(file.fileno())
+        self._config_sig = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        self._cookie = config.get("cookie", {})
+        self._users = dict(config["credentials"]["usernames"] or {})
+        self._emails = {data["email"]: username for username, data in self._users.items()}
+        preauthorized = (config.get("preauthorized") or {}).get("emails") or []
+        self._preauthorized = list(preauthorized)
+        self._preauthorized_set = set(preauthorized)
+        self._credentials = {"usernames": self._users}
+        self._preauthorized_config = {"emails": self._preauthorized}
+
+        # Users up to the last fold are already in config.yaml, unless it has
+        # been edited by hand since: then replay the whole journal
+        offset, folded_sig = self._last_fold()
+        if folded_sig == self._config_sig:
+            self._journal_offset = offset
+        else:
+            self._journal_offset = 0
+        # Signature of the config.yaml written by the latest fold
+        self._compacted_sig = folded_sig
+        self._journal_entries = 0
+        self._replay_journal()
+
+    def _last_fold(self):
+        """Find the last fold marker, returns (offset after it, config signature) or (0, None)"""
+        if not os.path.exists(self.journal_path):
+            return 0, None
+        with open(self.journal_path, "rb") as journal:
+            # Scan backwards a block at a time; markers always start a line
+            position = journal.seek(0, os.SEEK_END)
+            overlap = b""
+            while position > 0:
+                start = max(0, position - FOLD_SCAN_BLOCK)
+                journal.seek(start)
+                block = journal.read(position - start) + overlap
+                if start == 0:
+                    block = b"\n" + block
+                    start = -1
+                index = block.rfind(b"\n" + FOLD_MARKER)
+                if index != -1:
+                    journal.seek(start + index + 1)
+                    line = journal.readline()
+                    if line.endswith(b"\n"):
+                        return start + index + 1 + len(line), tuple(json.loads(line)["compacted"])
+                    # Partially written marker, look further back
+                    position, overlap = start + index + 1, b""
+                    continue
+                position, overlap = max(start, 0), block[:len(FOLD_MARKER)]
+        return 0, None
+
+    def _replay_journal(self):
+        """Apply journal lines written since the last read (by any process)"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as journal:
+            journal.seek(self._journal_offset)
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    break  # partially written line, pick it up next time
+                self._journal_offset += len(line)
+                entry = json.loads(line)
+                if "compacted" in entry:
+                    self._compacted_sig = tuple(entry["compacted"])
+                    continue
+                self._apply(entry["username"], entry["email"], entry["name"], entry["password"])
+                self._journal_entries += 1
+
+    def _refresh(self):
+        """Catch up with changes made by other processes"""
+        journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if journal_size < self._journal_offset:
+            # Journal was reset, start over
+            self._load()
+            return
+        if journal_size > self._journal_offset:
+            self._replay_journal()
+        config_sig = self._config_signature()
+        if config_sig != self._config_sig:
+            if config_sig == self._compacted_sig:
+                # Folded from journal entries we have already applied
+                self._config_sig = config_sig
+            else:
+                # config.yaml was edited by hand, start over
+                self._load()
+
+    def _apply(self, username, email, name, hashed_password):
+        self._users[username] = {
+            "email": email,
+            "name": name,
+            "password": hashed_password
+        }
+        self._emails[email] = username
+        if email not in self._preauthorized_set:
+            self._preauthorized_set.add(email)
+            self._preauthorized.append(email)
+
+    # Lookups
+
+    def has_username(self, username):
+        return username in self._users
+
+    def has_email(self, email):
+        return email in self._emails
+
+    def get_user(self, username):
+        return self._users.get(username)
+
+    def find_username_by_email(self, email):
+        return self._emails.get(email)
+
+    def is_preauthorized(self, email):
+        return email in self._preauthorized_set
+
+    def __len__(self):
+        return len(self._users)
+
+    # Writes
+
+    def _locked_journal(self):
+        journal = open(self.journal_path, "ab")
+        if fcntl is not None:
+            fcntl.flock(journal, fcntl.LOCK_EX)
+        return journal
+
+    def add_user(self, username, email, name, hashed_password):
+        """Add a user with an already hashed password, returns (success, message)"""
+        with self.lock:
+            journal = self._locked_journal()
+            try:
+                self._refresh()
+
+                if username in self._users:
+                    return False, "Username already exists"
+                if email in self._emails:
+                    return False, "Email already exists"
+
+                entry = {"username": username, "email": email, "name": name, "password": hashed_password}
+                line = (json.dumps(entry) + "\n").encode("utf-8")
+                journal.write(line)
+                journal.flush()
+                os.fsync(journal.fileno())
+
+                self._apply(username, email, name, hashed_password)
+                self._journal_offset += len(line)
+                self._journal_entries += 1
+            finally:
+                journal.close()
+        return True, "Registration successful"
+
+    def add_users(self, users):
+        """Add many users with already hashed passwords and fold them into config.yaml
+
+        `users` is a list of dicts with username, email, name and password.
+        The batch is appended to the journal in one write, then config.yaml is
+        rewritten once. Returns (added usernames, [(username, reason)] for
+        skipped users).
+        """
+        added, skipped = [], []
+        with self.lock:
+            journal = self._locked_journal()
+            try:
+                self._refresh()
+                lines = []
+                for user in users:
+                    if user["username"] in self._users:
+                        skipped.append((user["username"], "Username already exists"))
+                    elif user["email"] in self._emails:
+                        skipped.append((user["username"], "Email already exists"))
+                    else:
+                        self._apply(user["username"], user["email"], user["name"], user["password"])
+                        entry = {key: user[key] for key in ("username", "email", "name", "password")}
+                        lines.append((json.dumps(entry) + "\n").encode("utf-8"))
+                        added.append(user["username"])
+                if added:
+                    data = b"".join(lines)
+                    journal.write(data)
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                    self._journal_offset += len(data)
+                    self._journal_entries += len(added)
+                    self._compact(journal)
+            finally:
+                journal.close()
+        return added, skipped
+
+    def compact(self, reset_journal=False):
+        """Fold the journal into config.yaml
+
+        Meant for a maintenance step, not for request handling. With
+        `reset_journal` the journal is emptied afterwards, which makes running
+        app processes reload config.yaml, so only use it while the app is down.
+        """
+        with self.lock:
+            journal = self._locked_journal()
+            try:
+                self._refresh()
+                self._compact(journal)
+                if reset_journal:
+                    os.truncate(self.journal_path, 0)
+                    self._journal_offset = 0
+                    self._journal_entries = 0
+            finally:
+                journal.close()
+
+    def _compact(self, journal):
+        # Caller holds the journal lock
+        tmp_path = f"{self.config_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            yaml.dump(self._export(), file, Dumper=SafeDumper, default_flow_style=False)
+            file.flush()
+            os.fsync(file.fileno())
+            stat = os.fstat(file.fileno())
+        # The rename keeps inode, mtime and size, so the marker can go first:
+        # other processes then never see the new config.yaml without it
+        config_sig = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        line = (json.dumps({"compacted": config_sig}) + "\n").encode("utf-8")
+        journal.write(line)
+        journal.flush()
+        os.fsync(journal.fileno())
+        os.replace(tmp_path, self.config_path)
+
+        self._journal_offset += len(line)
+        self._config_sig = self._compacted_sig = config_sig
+
+    # Export
+
+    def export_config(self):
+        """Return a config dict in the layout expected by stauth.Authenticate
+
+        The credentials and preauthorized emails are live views kept up to
+        date as users are added, not copies, so treat them as read-only and
+        hold `lock` until stauth.Authenticate has taken its own copy.
+        """
+        with self.lock:
+            if os.path.exists(self.config_path):
+                self._refresh()
+            return {
+                "credentials": dict(self._credentials),
+                "cookie": self._cookie,
+                "preauthorized": self._preauthorized_config
+            }
+
+    def _export(self):
+        return {
+            "credentials": {"usernames": {username: dict(data) for username, data in self._users.items()}},
+            "cookie": dict(self._cookie),
+            "preauthorized": {"emails": list(self._preauthorized)}
+        }
+
+
+if __name__ == "__main__":
+    # python user_store.py [config.yaml] [--reset-journal]
+    args = [arg for arg in sys.argv[1:] if arg != "--reset-journal"]
+    store = UserStore(args[0] if args else "config.yaml")
+    store.compact(reset_journal="--reset-journal" in sys.argv)
+    print(f"Folded {store.journal_path} into {store.config_path} ({len(store)} users)")
@@ -0,0 +1,303 @@
+import os
+import re
+import sys
+import time
+import zlib
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Offline stand-in for YouTube, for deterministic load tests and benchmarks.
+#
+# Metadata is derived from the video ID, so every run sees the same titles and
+# durations. Latency, error rate and rate limiting are configurable; the random
+# draws are seeded per (seed, video ID, call number) so results do not depend
+# on thread scheduling (call numbers are tracked for the most recently used
+# `max_tracked_videos` videos). The simulator is exposed through the same call paths
+# the app uses:
+#
+#   YouTube(url).length                        like pytube.YouTube
+#   build("youtube", "v3").videos().list(...)  like googleapiclient.discovery.build
+#   simulated_play(video_id)                   stands in for the IFrame player
+#                                              (youtube_player(simulated=...))
+#
+# Set CLASSICSAI_YOUTUBE_SIM=1 to make streamlit_app.py use it. The other
+# CLASSICSAI_SIM_* variables below tune its behaviour.
+
+COMPOSERS = ["Beethoven", "Mozart", "Bach", "Haydn", "Chopin", "Vivaldi"]
+INSTRUMENTS = ["Piano", "Violin", "Cello", "Flute"]
+FORMS = ["Concerto", "Sonata", "Symphony"]
+
+VIDEO_ID_PATTERN = re.compile(r"(?:v=|youtu\.be\/|embed\/)([a-zA-Z0-9_-]{11})")
+
+
+class SimulatedNetworkError(Exception):
+    pass
+
+
+class SimulatedRateLimitError(SimulatedNetworkError):
+    # HTTP status the real API answers with when throttling
+    status_code = 429
+
+
+def enabled():
+    return os.environ.get("CLASSICSAI_YOUTUBE_SIM", "") not in ("", "0", "false")
+
+
+def _stable_hash(*parts):
+    return zlib.crc32(":".join(str(part) for part in parts).encode("utf-8"))
+
+
+def video_metadata(video_id):
+    """Deterministic metadata for a video ID"""
+    h = _stable_hash("meta", video_id)
+    return {
+        "video_id": video_id,
+        "title": f"{COMPOSERS[h % 6]} - New {INSTRUMENTS[(h >> 3) % 4]} {FORMS[(h >> 5) % 3]} {(h >> 7) % 50 + 1}",
+        "author": "ClassicsAI",
+        "length": 120 + (h >> 13) % 1680,  # 2 to 30 minutes
+        "views": (h >> 9) % 100000
+    }
+
+
+class YouTubeSimulator:
+    def __init__(self, seed=0, latency=0.15, jitter=0.05, error_rate=0.0,
+                 rate_limit=None, burst=10, max_tracked_videos=100000):
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Requests per second, None for unlimited
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        # Call number per (endpoint, video ID), least recently used first
+        self._calls = OrderedDict()
+        self.max_tracked_videos = max_tracked_videos
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    @classmethod
+    def from_env(cls):
+        rate_limit = os.environ.get("CLASSICSAI_SIM_RATE_LIMIT")
+        return cls(
+            seed=int(os.environ.get("CLASSICSAI_SIM_SEED", 0)),
+            latency=float(os.environ.get("CLASSICSAI_SIM_LATENCY_MS", 150)) / 1000,
+            jitter=float(os.environ.get("CLASSICSAI_SIM_JITTER_MS", 50)) / 1000,
+            error_rate=float(os.environ.get("CLASSICSAI_SIM_ERROR_RATE", 0)),
+            rate_limit=float(rate_limit) if rate_limit else None,
+            burst=int(os.environ.get("CLASSICSAI_SIM_BURST", 10))
+        )
+
+    def _take_token(self):
+        if self.rate_limit is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_limit)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def request(self, endpoint, video_id):
+        """Simulate one network round trip for a video, returning its metadata"""
+        with self._lock:
+            self.stats["requests"] += 1
+            call = self._calls.pop((endpoint, video_id), 0)
+            self._calls[(endpoint, video_id)] = call + 1
+            if len(self._calls) > self.max_tracked_videos:
+                self._calls.popitem(last=False)
+            allowed = self._take_token()
+            if not allowed:
+                self.stats["rate_limited"] += 1
+
+        if not allowed:
+            raise SimulatedRateLimitError(f"Rate limit exceeded for {endpoint}")
+
+        rng = random.Random(_stable_hash(self.seed, endpoint, video_id, call))
+        time.sleep(max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter)))
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise SimulatedNetworkError(f"Simulated failure fetching {video_id}")
+        return video_metadata(video_id)
+
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+def get_simulator():
+    global _simulator
+    with _simulator_lock:
+        if _simulator is None:
+            _simulator = YouTubeSimulator.from_env()
+        return _simulator
+
+
+def configure(**options):
+    """Replace the shared simulator, e.g. configure(latency=0.3, error_rate=0.05)"""
+    global _simulator
+    with _simulator_lock:
+        _simulator = YouTubeSimulator(**options)
+        return _simulator
+
+
+# pytube-compatible interface
+
+class YouTube:
+    def __init__(self, url):
+        match = VIDEO_ID_PATTERN.search(url)
+        if not match:
+            raise ValueError(f"Could not find a video ID in {url}")
+        self.video_id = match.group(1)
+        self._metadata = None
+
+    def _fetch(self):
+        # Like pytube, metadata is fetched lazily on first attribute access
+        if self._metadata is None:
+            self._metadata = get_simulator().request("watch", self.video_id)
+        return self._metadata
+
+    @property
+    def length(self):
+        return self._fetch()["length"]
+
+    @property
+    def title(self):
+        return self._fetch()["title"]
+
+    @property
+    def author(self):
+        return self._fetch()["author"]
+
+    @property
+    def views(self):
+        return self._fetch()["views"]
+
+
+# googleapiclient-compatible interface (videos().list only)
+
+def _iso_duration(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"PT{hours}H{minutes}M{seconds}S" if hours else f"PT{minutes}M{seconds}S"
+
+
+class _Request:
+    def __init__(self, video_ids, parts):
+        self._video_ids = video_ids
+        self._parts = parts
+
+    def execute(self):
+        simulator = get_simulator()
+        # One round trip for the whole batch, as with the real API
+        if self._video_ids:
+            simulator.request("videos.list", ",".join(self._video_ids))
+        items = []
+        for video_id in self._video_ids:
+            metadata = video_metadata(video_id)
+            item = {"kind": "youtube#video", "id": video_id}
+            if "snippet" in self._parts:
+                item["snippet"] = {"title": metadata["title"], "channelTitle": metadata["author"]}
+            if "contentDetails" in self._parts:
+                item["contentDetails"] = {"duration": _iso_duration(metadata["length"])}
+            if "statistics" in self._parts:
+                item["statistics"] = {"viewCount": str(metadata["views"])}
+            items.append(item)
+        return {"kind": "youtube#videoListResponse", "items": items}
+
+
+class _Videos:
+    def list(self, part, id, **kwargs):
+        video_ids = [video_id for video_id in id.split(",") if video_id][:50]
+        return _Request(video_ids, set(part.split(",")))
+
+
+class _Service:
+    def videos(self):
+        return _Videos()
+
+
+def build(service_name, version, developerKey=None, **kwargs):
+    return _Service()
+
+
+# IFrame player stand-in
+
+def embed_html(video_id):
+    """Local placeholder for the YouTube IFrame player, showing the simulated title"""
+    metadata = video_metadata(video_id)
+    return f"""
+    <div style="padding: 20px; background-color: #EAE6D9; border: 2px dashed #D4AF37; border-radius: 8px; text-align: center;">
+        <p><strong>Simulated player</strong></p>
+        <p>{metadata["title"]} ({metadata["length"] // 60}:{metadata["length"] % 60:02d})</p>
+    </div>
+    """
+
+
+def simulated_play(video_id, start=0):
+    """Arguments for the player component to play a simulated video
+
+    The component shows embed_html() instead of loading YouTube and, with
+    autoplay, reports the end of the video once its remaining length has
+    passed, through the same path as the real player's end event.
+    """
+    metadata = video_metadata(video_id)
+    # Compress playback time so load tests don't wait for whole tracks
+    speed = float(os.environ.get("CLASSICSAI_SIM_PLAYBACK_SPEED", 1))
+    return {
+        "html": embed_html(video_id),
+        "ends_in_ms": int(max(0, metadata["length"] - start) * 1000 / speed)
+    }
+
+
+def benchmark(video_ids, concurrency=8, lookup=None):
+    """Fetch durations for video_ids with `concurrency` threads and report timings
+
+    `lookup` defaults to YouTube(url).length, pass a cached function to
+    compare caching strategies against the same simulated network.
+    """
+    if lookup is None:
+        lookup = lambda video_id: YouTube(f"https://www.youtube.com/watch?v={video_id}").length
+
+    def timed(video_id):
+        start = time.perf_counter()
+        try:
+            lookup(video_id)
+            ok = True
+        except SimulatedNetworkError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, video_ids))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "requests": len(results),
+        "failures": sum(1 for _, ok in results if not ok),
+        "seconds": elapsed,
+        "per_second": len(results) / elapsed if elapsed else 0.0,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+    }
+
+
+if __name__ == "__main__":
+    # python youtube_sim.py [requests] [concurrency]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rng = random.Random(get_simulator().seed)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    ids = ["".join(rng.choice(alphabet) for _ in range(11)) for _ in range(count)]
+    report = benchmark(ids, concurrency)
+    print(", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                    for key, value in report.items()))
+    print(f"simulator: {get_simulator().stats}")